@@ -0,0 +1,323 @@
+from typing import Optional
+
+import numpy as np
+
+from enums import Race
+from game import Midnight, Battle, Army, Character, Location
+from odds import Strikers, get_battle_inputs
+
+
+class BattleStatistics:
+    __slots__ = ('trials', 'free_casualties', 'foul_casualties', 'free_kills', 'foul_kills', 'winners')
+
+    def __init__(self, trials: int, free_casualties: np.ndarray, foul_casualties: np.ndarray, free_kills: np.ndarray,
+                 foul_kills: np.ndarray, winners: dict[Optional[Race], int]) -> None:
+        self.trials = trials
+        self.free_casualties = free_casualties
+        self.foul_casualties = foul_casualties
+        self.free_kills = free_kills
+        self.foul_kills = foul_kills
+        self.winners = winners
+
+    def get_trials(self) -> int:
+        return self.trials
+
+    # Each histogram counts trials by total, so free_casualties[n] is the number of trials where the free side lost n.
+
+    def get_free_casualties(self) -> np.ndarray:
+        return self.free_casualties
+
+    def get_foul_casualties(self) -> np.ndarray:
+        return self.foul_casualties
+
+    def get_free_kills(self) -> np.ndarray:
+        return self.free_kills
+
+    def get_foul_kills(self) -> np.ndarray:
+        return self.foul_kills
+
+    def get_winners(self) -> dict[Optional[Race], int]:
+        return self.winners
+
+
+class Defenders:
+    # One side of every battle, copied into dense (battle, roster column) arrays that are addressed through flat
+    # indices, and written back once every attacker has struck.
+    __slots__ = ('valid', 'width', 'roster', 'entered', 'before', 'how_many', 'parries', 'count', 'alive', 'slots')
+
+    def __init__(self, rosters: np.ndarray, listed: np.ndarray, how_many: np.ndarray, chances: np.ndarray) -> None:
+        self.valid = rosters >= 0
+        self.width = self.valid.shape[1]
+        self.roster = np.where(self.valid, rosters, 0)
+        self.entered = self.valid & listed[self.roster]
+        self.before = np.where(self.valid, how_many[self.roster], 0).ravel()
+        self.how_many = self.before.copy()
+        # Midnight.random(256) is inclusive, so a blow lands when the enemy's roll of 0..256 beats its success chance.
+        self.parries = np.clip(256 - chances[self.roster].ravel(), 0, 257) / 257
+        # Each battle lists the columns of its enemies still standing in its first count slots, so a uniform pick is
+        # a single lookup. A fallen enemy swaps places with the last one standing; slots finds where a column sits.
+        self.count = self.entered.sum(axis=1, dtype=np.int32)
+        alive = np.argsort(~self.entered, axis=1, kind='stable').astype(np.int32)
+        slots = np.empty_like(alive)
+        np.put_along_axis(slots, alive, np.arange(self.width, dtype=np.int32)[None, :], axis=1)
+        self.alive = alive.ravel()
+        self.slots = slots.ravel()
+
+    def get_standing(self) -> np.ndarray:
+        return self.slots.reshape(self.valid.shape) < self.count[:, None]
+
+    def get_weakest(self) -> np.ndarray:
+        return np.where(self.entered, self.how_many.reshape(self.valid.shape), np.iinfo(np.int32).max).min(axis=1)
+
+    def strike(self, rng: np.random.Generator, battles: np.ndarray, swings: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # One uniform draw per attempt: its whole part picks among the enemies still standing, and the fraction left
+        # over is a fresh uniform that decides whether the swing and the blow both land. Returns flat cells and hits.
+        rows = battles * self.width
+        draw = rng.random(len(battles)) * self.count[battles]
+        nth = draw.astype(np.int32)
+        cells = rows + self.alive[rows + nth]
+        return cells, draw - nth < swings * self.parries[cells]
+
+    def share(self, rng: np.random.Generator, battles: np.ndarray, blows: np.ndarray) -> None:
+        # Every blow that lands picks its enemy in proportion to the enemy's parry chance, whoever struck it, so a
+        # battle's blows split multinomially over its roster. That is drawn as one binomial per roster slot.
+        rows = battles * self.width
+        weights = self.parries[rows[:, None] + self.alive.reshape(self.valid.shape)[battles]]
+        weights[np.arange(self.width) >= self.count[battles][:, None]] = 0
+        rest = np.cumsum(weights[:, ::-1], axis=1)[:, ::-1]
+        for slot in range(self.width):
+            chance = np.divide(weights[:, slot], rest[:, slot], out=np.zeros(len(battles)), where=rest[:, slot] > 0)
+            landed = rng.binomial(blows, np.minimum(chance, 1))
+            self.how_many[rows + self.alive[rows + slot]] -= landed.astype(np.int32) * BattleResolver.CASUALTIES
+            blows = blows - landed
+
+    def fall(self, battles: np.ndarray, cells: np.ndarray) -> None:
+        rows = battles * self.width
+        self.count[battles] -= 1
+        last = self.alive[rows + self.count[battles]]
+        slot = self.slots[cells]
+        self.alive[rows + slot] = last
+        self.slots[rows + last] = slot
+
+    def store(self, resolver: 'BattleResolver') -> None:
+        # Every blow costs five, so the casualties follow from the losses, except for an army that fell: it took one
+        # blow per five men it started with, rounded up, and at least one.
+        armies = self.roster[self.valid]
+        entered = self.entered[self.valid]
+        listed = self.get_standing()[self.valid]
+        before = self.before.reshape(self.valid.shape)[self.valid]
+        after = self.how_many.reshape(self.valid.shape)[self.valid]
+        fell = np.maximum(-(-before // BattleResolver.CASUALTIES), 1) * BattleResolver.CASUALTIES
+        resolver.casualties[armies] += np.where(listed, before - after, np.where(entered, fell, 0))
+        resolver.how_many[armies] = after
+        resolver.listed[armies] = listed
+
+
+class BattleResolver:
+    FREE = 0
+    FOUL = 1
+    CASUALTIES = 5
+
+    def __init__(self, game: Midnight, seed: Optional[int] = None) -> None:
+        self.game = game
+        self.rng = np.random.default_rng(seed)
+
+    def load(self, battles: list[Battle]) -> None:
+        self.armies: list[Army] = []
+        battle_of = []
+        sides = []
+        rosters = [([], []) for _ in battles]
+        for b, battle in enumerate(battles):
+            for side, armies in ((self.FREE, battle.free), (self.FOUL, battle.foul)):
+                for army in armies:
+                    rosters[b][side].append(len(self.armies))
+                    self.armies.append(army)
+                    battle_of.append(b)
+                    sides.append(side)
+
+        width = max([len(roster) for pair in rosters for roster in pair], default=0)
+        padded = np.full((len(battles), 2, max(width, 1)), -1, dtype=np.int32)
+        for b, pair in enumerate(rosters):
+            for side, roster in enumerate(pair):
+                padded[b, side, :len(roster)] = roster
+
+        self.set_state(np.array(battle_of, dtype=np.int32), np.array(sides, dtype=np.int32),
+                       np.array([army.get_how_many() for army in self.armies], dtype=np.int32),
+                       np.array([army.get_success_chance() for army in self.armies], dtype=np.int32), padded)
+
+    def set_state(self, battle_of: np.ndarray, sides: np.ndarray, how_many: np.ndarray, chance: np.ndarray,
+                  rosters: np.ndarray) -> None:
+        self.battle_of = battle_of
+        self.sides = sides
+        self.how_many = how_many
+        self.chance = chance
+        self.rosters = rosters
+        self.casualties = np.zeros(len(how_many), dtype=np.int32)
+        self.listed = np.ones(len(how_many), dtype=bool)
+
+    def attack(self, battles: np.ndarray, hits: np.ndarray, chances: np.ndarray, side: int) -> np.ndarray:
+        defenders = Defenders(self.rosters[:, side], self.listed, self.how_many, self.chance)
+        # Midnight.random(256) is inclusive, so a swing lands when a roll of 0..256 falls below the chance.
+        swings = np.clip(chances, 0, 257) / 257
+        # One attempt per enemy listed when an attacker starts, stopping after hits + 1 attempts. The count never
+        # grows, so where even the weakest enemy outlasts every attempt of the phase, nobody falls and all of the
+        # attempts are independent. Those battles are settled in one pass; the rest go attacker by attacker.
+        attempts = np.minimum(defenders.count[battles], hits + 1)
+        bound = np.bincount(battles, weights=attempts, minlength=len(defenders.count))
+        together = (defenders.get_weakest() > bound * self.CASUALTIES)[battles]
+
+        killed = np.zeros(len(battles), dtype=np.int32)
+        killed[together] = self.strike_together(defenders, battles[together], swings[together], attempts[together])
+        apart = np.flatnonzero(~together)
+        for turn in self.get_turns(battles[apart]):
+            attackers = apart[turn]
+            killed[attackers] = self.strike_in_steps(defenders, battles[attackers], swings[attackers],
+                                                     hits[attackers])
+        defenders.store(self)
+        return killed
+
+    def strike_together(self, defenders: Defenders, battles: np.ndarray, swings: np.ndarray,
+                        attempts: np.ndarray) -> np.ndarray:
+        # An attempt lands with the swing chance times the mean parry chance of the enemies standing.
+        standing = defenders.get_standing()
+        mean = (standing * defenders.parries.reshape(standing.shape)).sum(axis=1) / np.maximum(defenders.count, 1)
+        landed = self.rng.binomial(attempts, np.minimum(swings * mean[battles], 1))
+        blows = np.bincount(battles, weights=landed, minlength=len(defenders.count)).astype(np.int64)
+        struck = np.flatnonzero(blows)
+        defenders.share(self.rng, struck, blows[struck])
+        return landed.astype(np.int32) * self.CASUALTIES
+
+    def strike_in_steps(self, defenders: Defenders, battles: np.ndarray, swings: np.ndarray,
+                        hits: np.ndarray) -> np.ndarray:
+        # Each battle here has exactly one of these attackers, striking after those of the earlier turns.
+        attempts = np.minimum(defenders.count[battles], hits + 1)
+        index = np.arange(len(battles))
+        killed = np.zeros(len(battles), dtype=np.int32)
+        struck = np.zeros(len(battles), dtype=np.int32)
+        going = attempts > 0
+        step = 0
+        while True:
+            # Attackers out of attempts, or without anyone left to strike, leave the arrays once enough of them have
+            # finished; until then they roll along without effect.
+            moving = int(going.sum())
+            if moving == 0:
+                break
+            if moving * 4 < len(going) * 3:
+                killed[index] += struck
+                index = index[going]
+                battles = battles[going]
+                swings = swings[going]
+                attempts = attempts[going]
+                going = np.ones(moving, dtype=bool)
+                struck = np.zeros(moving, dtype=np.int32)
+
+            cells, hit = defenders.strike(self.rng, battles, swings)
+            hit &= going
+            damage = hit * self.CASUALTIES
+
+            # Only one attacker per battle swings at a time, so no cell is struck twice in a step.
+            struck += damage
+            left = np.maximum(defenders.how_many[cells] - damage, 0)
+            defenders.how_many[cells] = left
+            step += 1
+            going &= attempts > step
+            fallen = np.flatnonzero(hit & (left == 0))
+            if len(fallen):
+                defenders.fall(battles[fallen], cells[fallen])
+                going[fallen] &= defenders.count[battles[fallen]] > 0
+        killed[index] += struck
+        return killed
+
+    @staticmethod
+    def get_turns(battles: np.ndarray) -> list[np.ndarray]:
+        # Splits the attackers by their rank within their battle, keeping roster order inside each battle.
+        order = np.argsort(battles, kind='stable')
+        ranked = battles[order]
+        starts = np.flatnonzero(np.concatenate([[True], ranked[1:] != ranked[:-1]]))
+        counts = np.diff(np.append(starts, len(ranked)))
+        rank = (np.arange(len(ranked)) - np.repeat(starts, counts)).astype(np.int16)
+        return np.split(order[np.argsort(rank, kind='stable')], np.cumsum(np.bincount(rank))[:-1])
+
+    def resolve(self, character_battles: np.ndarray, strengths: np.ndarray,
+                energies: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        free = np.nonzero(self.sides == self.FREE)[0]
+        foul = np.nonzero(self.sides == self.FOUL)[0]
+
+        battles = np.concatenate([character_battles, self.battle_of[free]])
+        hits = np.concatenate([strengths, self.how_many[free] // 5])
+        chances = np.concatenate([energies + 0x80, self.chance[free]])
+        free_killed = self.attack(battles, hits, chances, self.FOUL)
+        # Battle.run pops wiped-out foul armies, so they never strike back.
+        foul = foul[self.listed[foul]]
+        foul_killed = self.attack(self.battle_of[foul], self.how_many[foul] // 5, self.chance[foul], self.FREE)
+
+        army_killed = np.zeros(len(self.how_many), dtype=np.int32)
+        army_killed[free] = free_killed[len(character_battles):]
+        army_killed[foul] = foul_killed
+        return free_killed[:len(character_battles)], army_killed, self.casualties
+
+    def run(self, battles: list[Battle]) -> None:
+        self.load(battles)
+
+        characters: list[Character] = []
+        character_battles = []
+        for b, battle in enumerate(battles):
+            for character in battle.characters:
+                characters.append(character)
+                character_battles.append(b)
+
+        character_killed, army_killed, _ = self.resolve(
+            np.array(character_battles, dtype=np.int32),
+            np.array([character.get_strength() for character in characters], dtype=np.int32),
+            np.array([character.get_energy() for character in characters], dtype=np.int32))
+
+        for character, killed in zip(characters, character_killed.tolist()):
+            character.set_enemy_killed(killed)
+        listed = self.listed.tolist()
+        for army, killed, side, present in zip(self.armies, army_killed.tolist(), self.sides.tolist(), listed):
+            if side == self.FREE or present:
+                army.set_enemy_killed(killed)
+        for army, casualties in zip(self.armies, self.casualties.tolist()):
+            if casualties > 0:
+                army.append_casualties(casualties)
+
+        for b, battle in enumerate(battles):
+            battle.free = [self.armies[i] for i in self.rosters[b, self.FREE].tolist() if i >= 0 and listed[i]]
+            battle.foul = [self.armies[i] for i in self.rosters[b, self.FOUL].tolist() if i >= 0 and listed[i]]
+            battle.determine_result()
+
+    def simulate(self, location: Location, trials: int) -> BattleStatistics:
+        return self.simulate_inputs(*get_battle_inputs(location), trials)
+
+    def simulate_inputs(self, characters: Strikers, free: Strikers, foul: Strikers, trials: int) -> BattleStatistics:
+        armies = free + foul
+        per = len(armies)
+        rosters = np.full((trials, 2, max(len(free), len(foul), 1)), -1, dtype=np.int32)
+        base = np.arange(trials, dtype=np.int32)[:, None] * per
+        rosters[:, self.FREE, :len(free)] = base + np.arange(len(free), dtype=np.int32)
+        rosters[:, self.FOUL, :len(foul)] = base + len(free) + np.arange(len(foul), dtype=np.int32)
+        self.set_state(np.repeat(np.arange(trials, dtype=np.int32), per),
+                       np.tile(np.array([self.FREE] * len(free) + [self.FOUL] * len(foul), dtype=np.int32), trials),
+                       np.tile(np.array([how_many for how_many, _ in armies], dtype=np.int32), trials),
+                       np.tile(np.array([chance for _, chance in armies], dtype=np.int32), trials), rosters)
+
+        character_killed, army_killed, casualties = self.resolve(
+            np.repeat(np.arange(trials, dtype=np.int32), len(characters)),
+            np.tile(np.array([strength for strength, _ in characters], dtype=np.int32), trials),
+            np.tile(np.array([energy for _, energy in characters], dtype=np.int32), trials))
+
+        casualties = casualties.reshape(trials, per)
+        army_killed = army_killed.reshape(trials, per)
+        listed = self.listed.reshape(trials, per)
+        free_kills = character_killed.reshape(trials, len(characters)).sum(axis=1) + army_killed[:, :len(free)].sum(
+            axis=1)
+        foul_left = listed[:, len(free):].any(axis=1)
+        free_left = listed[:, :len(free)].any(axis=1)
+        return BattleStatistics(trials,
+                                np.bincount(casualties[:, :len(free)].sum(axis=1)),
+                                np.bincount(casualties[:, len(free):].sum(axis=1)),
+                                np.bincount(free_kills),
+                                np.bincount(army_killed[:, len(free):].sum(axis=1)),
+                                {Race.FREE: int((~foul_left).sum()),
+                                 Race.FOUL: int((foul_left & ~free_left).sum()),
+                                 None: int((foul_left & free_left).sum())})
@@ -0,0 +1,277 @@
+from typing import Optional
+
+import numpy as np
+
+from enums import Direction, Feature, Orders, Type
+from game import Midnight, Doomguard, Character, Location, Map, MovementCosts, Terrain, RouteGraph
+from maps import routes
+
+
+class DoomguardEngine:
+    NOWHERE = -1
+    ARMY_LIMIT = 0x1f
+
+    def __init__(self, game: Midnight, compatible: bool = True, seed: Optional[int] = None) -> None:
+        self.game = game
+        self.compatible = compatible
+        self.rng = np.random.default_rng(seed)
+
+        terrain = Terrain.get_instance()
+        self.cells = terrain.size()
+        xs = np.array(terrain.xs[:self.cells], dtype=np.int32)
+        ys = np.array(terrain.ys[:self.cells], dtype=np.int32)
+        self.neighbours = np.full((self.cells, len(Direction.values)), self.NOWHERE, dtype=np.int32)
+        for direction in Direction.values:
+            nx = xs + direction.get_x_adjustment()
+            ny = ys + direction.get_y_adjustment()
+            inside = (nx >= 0) & (ny >= 0) & (nx < Map.WIDTH) & (ny < Map.HEIGHT)
+            self.neighbours[inside, direction.ordinal] = ny[inside] * Map.WIDTH + nx[inside]
+        self.xs = xs
+        self.ys = ys
+        self.turn_left = np.array([d.turn_left().ordinal for d in Direction.values], dtype=np.int32)
+        self.turn_right = np.array([d.turn_right().ordinal for d in Direction.values], dtype=np.int32)
+        self.by_sign = np.array([[-1 if d is None else d.ordinal for d in row] for row in Direction.BY_SIGN],
+                                dtype=np.int32)
+        self.next_a = np.array(RouteGraph.get_instance().next_a, dtype=np.int32)
+        self.next_b = np.array(RouteGraph.get_instance().next_b, dtype=np.int32)
+        self.route_cells = np.array([route[1] * Map.WIDTH + route[0] for route in routes], dtype=np.int32)
+
+    def load_cells(self) -> None:
+        terrain = Terrain.get_instance()
+        features = [feature.ordinal for feature in terrain.features[:self.cells]]
+        special = list(terrain.specials[:self.cells])
+        for index, location in self.game.get_map().locations.items():
+            features[index] = location.get_feature().ordinal
+            special[index] = location.is_special()
+        features = np.array(features, dtype=np.int32)
+        # Off-map neighbours (index -1) read the extra trailing entry, which is frozen waste.
+        self.frozen = np.append(features == Feature.FROZEN_WASTE.ordinal, True)
+        self.rough = np.append((features == Feature.FOREST.ordinal) | (features == Feature.MOUNTAIN.ordinal) | (
+                features == Feature.FROZEN_WASTE.ordinal), True)
+        self.special = np.append(np.array(special, dtype=bool), False)
+        self.army_count = np.frombuffer(bytes(self.game.get_map().get_occupancy().armies), dtype=np.uint8).astype(
+            np.int32)
+        costs = self.game.get_map().get_movement_costs()
+        self.costs = np.stack([
+            np.frombuffer(bytes(costs.grids[MovementCosts.DOOMGUARD_WARRIORS]), dtype=np.uint8)[::len(Direction.values)],
+            np.frombuffer(bytes(costs.grids[MovementCosts.DOOMGUARD_RIDERS]), dtype=np.uint8)[::len(Direction.values)],
+        ]).astype(np.int32)
+
+    def load_units(self) -> None:
+        units = self.game.doomguard
+        self.positions = np.array([unit.get_location().get_index() for unit in units], dtype=np.int32)
+        self.move_counts = np.array([unit.get_move_count() for unit in units], dtype=np.int32)
+        self.orders = np.array([unit.get_orders().ordinal for unit in units], dtype=np.int32)
+        self.riders = np.array([1 if unit.get_type() == Type.RIDERS else 0 for unit in units], dtype=np.int32)
+        self.targets = np.array([self.get_target_cell(unit) for unit in units], dtype=np.int32)
+        self.retargeted = np.zeros(len(units), dtype=bool)
+
+    def get_target_cell(self, unit: Doomguard) -> int:
+        target = unit.get_target()
+        if isinstance(target, Character):
+            return self.get_follow_target(target).get_location().get_index()
+        if isinstance(target, Location):
+            return target.get_index()
+        return self.NOWHERE
+
+    def get_follow_target(self, character: Character) -> Character:
+        if character.is_alive():
+            return character
+        return self.game.LUXOR if self.game.LUXOR.is_alive() else self.game.MORKIN
+
+    def run(self) -> None:
+        self.load_cells()
+        self.load_units()
+        if self.compatible:
+            self.run_compatible()
+        else:
+            self.run_lock_step()
+
+    def store_targets(self) -> None:
+        map = self.game.get_map()
+        for i, unit in enumerate(self.game.doomguard):
+            if unit.get_orders() == Orders.FOLLOW:
+                if self.retargeted[i]:
+                    unit.target = self.get_follow_target(unit.get_target())
+            elif unit.get_orders() == Orders.ROUTE:
+                unit.target = map.get_location_at(int(self.targets[i]))
+            unit.reset_move_count()
+
+    # Compatible mode: one unit at a time, drawing from Midnight.random in the same order as Doomguard.execute_move.
+
+    def run_compatible(self) -> None:
+        self.path = []
+        positions = self.positions.tolist()
+        move_counts = self.move_counts.tolist()
+        self.state = (positions, move_counts)
+        for unit in range(len(positions)):
+            while move_counts[unit] < Doomguard.MAX_MOVE_COUNT:
+                self.execute_move(unit)
+
+        map = self.game.get_map()
+        for unit, cell in self.path:
+            self.game.doomguard[unit].set_location(map.get_location_at(cell))
+        self.store_targets()
+
+    def execute_move(self, unit: int) -> None:
+        positions, move_counts = self.state
+        position = positions[unit]
+        if self.special[position]:
+            self.stop_moving(unit)
+
+        for direction in range(len(Direction.values)):
+            neighbour = int(self.neighbours[position, direction])
+            if self.special[neighbour]:
+                self.move_to(unit, neighbour)
+                return
+
+        orders = self.orders[unit]
+        if orders == Orders.FOLLOW.ordinal:
+            self.retargeted[unit] = True
+            self.move_towards(unit, int(self.targets[unit]))
+        elif orders == Orders.GOTO.ordinal:
+            if self.special[self.targets[unit]]:
+                self.move_towards(unit, int(self.targets[unit]))
+            else:
+                self.stop_moving(unit)
+        elif orders == Orders.ROUTE.ordinal:
+            if position == self.targets[unit]:
+                node = self.game.get_map().get_route_graph().get_node_index(int(self.xs[position]),
+                                                                            int(self.ys[position]))
+                self.targets[unit] = self.route_cells[
+                    self.next_a[node] if self.game.random(2) == 0 else self.next_b[node]]
+            self.move_towards(unit, int(self.targets[unit]))
+        elif orders == Orders.WANDER.ordinal:
+            while True:
+                rnd = self.game.random(8)
+                # As in Doomguard.wander, the inclusive draw of 8 names no direction and is drawn again.
+                if rnd == len(Direction.values):
+                    continue
+                destination = int(self.neighbours[position, Direction.get_direction(rnd).ordinal])
+                if not self.frozen[destination]:
+                    break
+            self.move_to(unit, destination)
+
+    def move_towards(self, unit: int, target: int) -> None:
+        position = self.state[0][unit]
+        if position == target:
+            self.stop_moving(unit)
+            return
+
+        direction = int(self.by_sign[np.sign(self.xs[target] - self.xs[position]) + 1][
+                            np.sign(self.ys[target] - self.ys[position]) + 1])
+        # As in Doomguard.move_towards, a draw of 4 keeps the previous candidate and with none the unit stops.
+        destination = None
+        for i in range(8):
+            rnd = self.game.random(4)
+            if rnd in [0, 1]:
+                destination = int(self.neighbours[position, direction])
+            elif rnd == 2:
+                destination = int(self.neighbours[position, self.turn_left[direction]])
+            elif rnd == 3:
+                destination = int(self.neighbours[position, self.turn_right[direction]])
+            if destination is not None and not self.rough[destination]:
+                break
+        if destination is not None and not self.frozen[destination]:
+            self.move_to(unit, destination)
+        else:
+            self.stop_moving(unit)
+
+    def move_to(self, unit: int, destination: int) -> None:
+        positions, move_counts = self.state
+        if self.army_count[destination] > self.ARMY_LIMIT:
+            self.stop_moving(unit)
+            return
+        move_counts[unit] += int(self.costs[self.riders[unit], destination])
+        self.army_count[positions[unit]] -= 1
+        self.army_count[destination] += 1
+        positions[unit] = destination
+        self.path.append((unit, destination))
+
+    def stop_moving(self, unit: int) -> None:
+        self.state[1][unit] = Doomguard.MAX_MOVE_COUNT
+
+    # Lock-step mode: every unit still moving advances one step per round, drawing from the engine's generator.
+
+    def run_lock_step(self) -> None:
+        units = np.arange(len(self.positions))
+        start = self.positions.copy()
+        while True:
+            active = units[self.move_counts < Doomguard.MAX_MOVE_COUNT]
+            if len(active) == 0:
+                break
+            positions = self.positions[active]
+            destinations = np.full(len(active), self.NOWHERE, dtype=np.int32)
+            stop = self.special[positions].copy()
+
+            around = self.neighbours[positions]
+            special_around = self.special[around]
+            lured = special_around.any(axis=1)
+            destinations[lured] = around[lured, special_around[lured].argmax(axis=1)]
+
+            orders = self.orders[active]
+            targets = self.targets[active]
+            pending = ~lured
+
+            follow = pending & (orders == Orders.FOLLOW.ordinal)
+            self.retargeted[active[follow]] = True
+            goto = pending & (orders == Orders.GOTO.ordinal)
+            stop |= goto & ~self.special[targets]
+            route = pending & (orders == Orders.ROUTE.ordinal)
+            arrived = route & (positions == targets)
+            if arrived.any():
+                nodes = np.array([RouteGraph.get_instance().get_node_index(int(self.xs[cell]), int(self.ys[cell]))
+                                  for cell in positions[arrived]], dtype=np.int32)
+                branch = self.rng.integers(0, 2, size=len(nodes)) == 0
+                targets[arrived] = self.route_cells[np.where(branch, self.next_a[nodes], self.next_b[nodes])]
+                self.targets[active[arrived]] = targets[arrived]
+
+            towards = (follow | (goto & self.special[targets]) | route)
+            at_target = towards & (positions == targets)
+            stop |= at_target
+            towards &= ~at_target
+            if towards.any():
+                destinations[towards] = self.pick_towards(positions[towards], targets[towards])
+
+            wander = pending & (orders == Orders.WANDER.ordinal)
+            if wander.any():
+                # Doomguard.wander redraws until it finds open ground, which is a uniform pick among the open
+                # neighbours. A unit with none stops here, where the scalar path would never return.
+                choices = around[wander]
+                keys = self.rng.random(choices.shape)
+                keys[self.frozen[choices]] = 2
+                picked = keys.argmin(axis=1)
+                destinations[wander] = np.where(keys.min(axis=1) < 2, choices[np.arange(len(choices)), picked],
+                                                self.NOWHERE)
+
+            moving = destinations != self.NOWHERE
+            moving &= ~self.frozen[destinations]
+            crowded = moving & (self.army_count[np.where(moving, destinations, 0)] > self.ARMY_LIMIT)
+            moving &= ~crowded
+            stop |= crowded | (~moving & ~lured)
+
+            movers = active[moving]
+            if len(movers):
+                np.add.at(self.army_count, self.positions[movers], -1)
+                np.add.at(self.army_count, destinations[moving], 1)
+                self.move_counts[movers] += self.costs[self.riders[movers], destinations[moving]]
+                self.positions[movers] = destinations[moving]
+            self.move_counts[active[stop]] = Doomguard.MAX_MOVE_COUNT
+
+        map = self.game.get_map()
+        for unit in units[self.positions != start]:
+            self.game.doomguard[unit].set_location(map.get_location_at(int(self.positions[unit])))
+        self.store_targets()
+
+    def pick_towards(self, positions: np.ndarray, targets: np.ndarray) -> np.ndarray:
+        dx = np.sign(self.xs[targets] - self.xs[positions]) + 1
+        dy = np.sign(self.ys[targets] - self.ys[positions]) + 1
+        heading = self.by_sign[dx, dy]
+        swerve = self.rng.integers(0, 4, size=(len(positions), 8))
+        candidates = np.where(swerve < 2, heading[:, None],
+                              np.where(swerve == 2, self.turn_left[heading][:, None],
+                                       self.turn_right[heading][:, None]))
+        cells = self.neighbours[positions[:, None], candidates]
+        smooth = ~self.rough[cells]
+        chosen = np.where(smooth.any(axis=1), smooth.argmax(axis=1), 7)
+        return cells[np.arange(len(cells)), chosen]
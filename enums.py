@@ -1,7 +1,17 @@
 from functools import total_ordering
+from typing import Optional
+
+
+def number(values: tuple) -> tuple:
+    for ordinal, value in enumerate(values):
+        value.ordinal = ordinal
+        value.mask = 1 << ordinal
+    return values
 
 
 class Race:
+    ordinal: int
+    mask: int
     MORKIN:'Race'
     WISE: 'Race'
     TARG: 'Race'
@@ -18,7 +28,7 @@ class Race:
         return self.description
 
     def get_index(self) -> int:
-        return Race.values.index(self)
+        return self.ordinal
 
     @staticmethod
     def get_race(index: int) -> 'Race':
@@ -33,7 +43,7 @@ Race.SKULKRIN = Race("Skulkrin")
 Race.DRAGON = Race("Dragon")
 Race.FOUL = Race("Foul")
 Race.MORKIN = Race("Morkin")
-Race.values = (Race.FOUL, Race.FREE, Race.FEY, Race.TARG, Race.WISE, Race.MORKIN, Race.SKULKRIN, Race.DRAGON)
+Race.values = number((Race.FOUL, Race.FREE, Race.FEY, Race.TARG, Race.WISE, Race.MORKIN, Race.SKULKRIN, Race.DRAGON))
 
 
 @total_ordering
@@ -53,7 +63,7 @@ class Condition:
         return self.ordinal < __value.ordinal
 
     def __eq__(self, __value):
-        return self.values == __value.ordinal
+        return self.ordinal == __value.ordinal
 
     @staticmethod
     def get_condition(index: int) -> 'Condition':
@@ -87,6 +97,8 @@ Type.RIDERS = Type("riders")
 
 
 class Orders:
+    ordinal: int
+    mask: int
     ROUTE: 'Orders'
     WANDER: 'Orders'
     GOTO: 'Orders'
@@ -99,7 +111,7 @@ class Orders:
         return self.description
 
     def get_index(self) -> int:
-        return Orders.values.index(self)
+        return self.ordinal
 
     @staticmethod
     def get_orders(index: int) -> 'Orders':
@@ -110,7 +122,7 @@ Orders.FOLLOW = Orders("Follow")
 Orders.GOTO = Orders("Go to")
 Orders.ROUTE = Orders("Route")
 Orders.WANDER = Orders("Wander")
-Orders.values = (Orders.GOTO, Orders.WANDER, Orders.FOLLOW, Orders.ROUTE)
+Orders.values = number((Orders.GOTO, Orders.WANDER, Orders.FOLLOW, Orders.ROUTE))
 
 
 @total_ordering
@@ -156,6 +168,8 @@ Courage.UTTERLY_BOLD = Courage("utterly bold")
 
 
 class Feature:
+    ordinal: int
+    mask: int
     KEEP: 'Feature'
     PLAINS: 'Feature'
     ARMY: 'Feature'
@@ -175,7 +189,7 @@ class Feature:
         return Feature.values[index]
 
     def get_index(self) -> int:
-        return Feature.values.index(self)
+        return self.ordinal
 
     def __str__(self):
         return self.description
@@ -197,13 +211,15 @@ Feature.LITH = Feature("lith")
 Feature.CAVERN = Feature("cavern")
 Feature.ARMY = Feature("plains")
 Feature.PLAINS = Feature("plains")
-Feature.values = (
+Feature.values = number((
     Feature.MOUNTAIN, Feature.CITADEL, Feature.FOREST, Feature.HENGE, Feature.TOWER, Feature.VILLAGE, Feature.DOWNS,
     Feature.KEEP, Feature.SNOWHALL, Feature.LAKE, Feature.FROZEN_WASTE, Feature.RUIN, Feature.LITH, Feature.CAVERN,
-    Feature.ARMY, Feature.PLAINS)
+    Feature.ARMY, Feature.PLAINS))
 
 
 class Object:
+    ordinal: int
+    mask: int
     SHADOWS_OF_DEATH: 'Object'
     WATERS_OF_LIFE: 'Object'
     CUP_OF_DREAMS: 'Object'
@@ -219,19 +235,20 @@ class Object:
     ICE_TROLLS: 'Object'
     DRAGONS: 'Object'
     NOTHING: 'Object'
+    BEASTS: int
 
     def __init__(self, description: str) -> None:
         self.description = description
 
     def is_beast(self) -> bool:
-        return self in [Object.WOLVES, Object.DRAGONS, Object.SKULKRIN, Object.ICE_TROLLS]
+        return (self.mask & Object.BEASTS) != 0
 
     @staticmethod
     def get_object(index: int) -> 'Object':
         return Object.values[index]
 
     def get_index(self) -> int:
-        return Object.values.index(self)
+        return self.ordinal
 
     def to_string(self, location) -> str:
         if self != Object.GUIDANCE:
@@ -271,12 +288,13 @@ Object.FAWKRIN = Object("Fawkrin the Skulkrin")
 Object.FARFLAME = Object("Farflame the Dragonlord")
 Object.LAKE_MIRROW = Object("Lake Mirrow")
 Object.LORGRIM = Object("Lorgrim the Wise")
-Object.values = (
+Object.values = number((
     Object.NOTHING, Object.WOLVES, Object.DRAGONS, Object.ICE_TROLLS, Object.SKULKRIN, Object.WILD_HORSES,
     Object.SHELTER,
     Object.GUIDANCE, Object.SHADOWS_OF_DEATH, Object.WATERS_OF_LIFE, Object.HAND_OF_DARK, Object.CUP_OF_DREAMS,
     Object.WOLFSLAYER, Object.DRAGONSLAYER, Object.ICE_CROWN, Object.MOON_RING, Object.FAWKRIN, Object.FARFLAME,
-    Object.LAKE_MIRROW, Object.LORGRIM)
+    Object.LAKE_MIRROW, Object.LORGRIM))
+Object.BEASTS = Object.WOLVES.mask | Object.DRAGONS.mask | Object.SKULKRIN.mask | Object.ICE_TROLLS.mask
 
 
 @total_ordering
@@ -314,6 +332,8 @@ Fear.UTTERLY_MILD = Fear("utterly mild")
 
 
 class Direction:
+    ordinal: int
+    mask: int
     NORTHWEST: 'Direction'
     WEST: 'Direction'
     SOUTHWEST: 'Direction'
@@ -322,6 +342,10 @@ class Direction:
     EAST: 'Direction'
     NORTHEAST: 'Direction'
     NORTH: 'Direction'
+    TURN_RIGHT: tuple['Direction', ...]
+    TURN_LEFT: tuple['Direction', ...]
+    DIAGONAL: tuple[bool, ...]
+    BY_SIGN: tuple[tuple[Optional['Direction'], ...], ...]
 
     def __init__(self, description: str, x_adjustment: int, y_adjustment: int) -> None:
         self.description = description
@@ -338,20 +362,24 @@ class Direction:
         return self.y_adjustment
 
     def get_index(self) -> int:
-        return Direction.values.index(self)
+        return self.ordinal
 
     @staticmethod
     def get_direction(index: int) -> 'Direction':
         return Direction.values[index]
 
     def turn_right(self) -> 'Direction':
-        return Direction.values[(self.get_index() + 1) % len(Direction.values)]
+        return Direction.TURN_RIGHT[self.ordinal]
 
     def turn_left(self) -> 'Direction':
-        return Direction.values[(len(Direction.values) + self.get_index()) % len(Direction.values)]
+        return Direction.TURN_LEFT[self.ordinal]
 
     def is_diagonal(self) -> bool:
-        return self.x_adjustment != 0 and self.y_adjustment != 0
+        return Direction.DIAGONAL[self.ordinal]
+
+    @staticmethod
+    def get_direction_by_sign(dx: int, dy: int) -> Optional['Direction']:
+        return Direction.BY_SIGN[(dx > 0) - (dx < 0) + 1][(dy > 0) - (dy < 0) + 1]
 
 
 Direction.NORTH = Direction("North", 0, -1)
@@ -362,12 +390,23 @@ Direction.SOUTH = Direction("South", 0, 1)
 Direction.SOUTHWEST = Direction("Southwest", -1, 1)
 Direction.WEST = Direction("West", -1, 0)
 Direction.NORTHWEST = Direction("Northwest", -1, -1)
-Direction.values = (
+Direction.values = number((
     Direction.NORTH, Direction.NORTHEAST, Direction.EAST, Direction.SOUTHEAST, Direction.SOUTH, Direction.SOUTHWEST,
-    Direction.WEST, Direction.NORTHWEST)
+    Direction.WEST, Direction.NORTHWEST))
+Direction.TURN_RIGHT = tuple(Direction.values[(d.ordinal + 1) % len(Direction.values)] for d in Direction.values)
+# Matches the original turn_left, which adds no offset and so keeps the current heading.
+Direction.TURN_LEFT = tuple(Direction.values[(len(Direction.values) + d.ordinal) % len(Direction.values)]
+                            for d in Direction.values)
+Direction.DIAGONAL = tuple(d.x_adjustment != 0 and d.y_adjustment != 0 for d in Direction.values)
+Direction.BY_SIGN = (
+    (Direction.NORTHWEST, Direction.WEST, Direction.SOUTHWEST),
+    (Direction.NORTH, None, Direction.SOUTH),
+    (Direction.NORTHEAST, Direction.EAST, Direction.SOUTHEAST))
 
 
 class Area:
+    ordinal: int
+    mask: int
     NOTHING: 'Area'
 
     def __init__(self, description: str) -> None:
@@ -378,7 +417,7 @@ class Area:
         return Area.values[index]
 
     def get_index(self) -> int:
-        return Area.values.index(self)
+        return self.ordinal
 
     def __str__(self):
         return self.description
@@ -449,7 +488,7 @@ Area.DAWN = Area("Dawn")
 Area.TRORN = Area("Trorn")
 Area.COOM = Area("Coom")
 
-Area.values = (
+Area.values = number((
     Area.NOTHING, Area.LOTHORIL, Area.GLOOM, Area.MOON, Area.MIRROW, Area.GLORIM, Area.KORKITH, Area.LOST, Area.DEAD,
     Area.WEIRD, Area.UGRAK, Area.DEATH, Area.DOOM, Area.DESPAIR, Area.VORGATH, Area.USHGARAK, Area.UGRORN, Area.KOR,
     Area.TOOMOG, Area.OGRIM, Area.DODRAK, Area.GORGRATH, Area.VALETHOR, Area.COROTH, Area.ASHIMAR, Area.ITHRIL,
@@ -458,10 +497,12 @@ Area.values = (
     Area.ODRARK, Area.ISHMALAY, Area.BRITH, Area.SILENCE, Area.ELENIL, Area.RORATH, Area.MORNING, Area.THIMRATH,
     Area.CORELAY, Area.RATHORN, Area.LORGRIM, Area.LOR, Area.FADRATH, Area.DROON, Area.GRARG, Area.DREAMS, Area.ITHRORN,
     Area.WHISPERS, Area.XAJORKITH, Area.HERATH, Area.KUMAR, Area.MARAKITH, Area.TARG, Area.UTARG, Area.ATHORIL,
-    Area.DREGRIM, Area.DAWN, Area.TRORN, Area.COOM)
+    Area.DREGRIM, Area.DAWN, Area.TRORN, Area.COOM))
 
 
 class Status:
+    ordinal: int
+    mask: int
     ICE_CROWN: 'Status'
     USHGARAK: 'Status'
     MORKIN_XAJORKITH: 'Status'
@@ -478,7 +519,7 @@ class Status:
         return self.description
 
     def get_index(self) -> int:
-        return Status.values.index(self)
+        return self.ordinal
 
     def get_status(self, index: int) -> 'Status':
         return Status.values[index]
@@ -489,4 +530,4 @@ Status.MORKIN_XAJORKITH = Status(Race.FOUL, "Xajorkith has fallend and Morkin is
 Status.USHGARAK = Status(Race.FREE, "Ushgarak has fallen.")
 Status.ICE_CROWN = Status(Race.FREE, "The Ice Crown has been destroyed.")
 
-Status.values = (Status.LUXOR_MORKIN_DEAD, Status.MORKIN_XAJORKITH, Status.USHGARAK, Status.ICE_CROWN)
+Status.values = number((Status.LUXOR_MORKIN_DEAD, Status.MORKIN_XAJORKITH, Status.USHGARAK, Status.ICE_CROWN))
@@ -1,13 +1,24 @@
+import copy
+import heapq
+import io
+import struct
 from abc import ABC
-from functools import total_ordering
+from functools import total_ordering, wraps
 from random import Random
-from typing import Optional, Any
+from typing import Optional, Any, Callable, Iterator, BinaryIO
+
+import numpy as np
 
 from enums import Race, Condition, Type, Orders, Courage, Feature, Object, Fear, Direction, Area, Status
 from maps import mainMap, referenceDescriptionMap, routes
+from rng import RandomSource, ReproducibleRandomSource
+
+NONE = 0xff
+NO_LOCATION = -2
 
 
 class Time:
+    __slots__ = ('time',)
     DAWN = 16
     NIGHT = 0
 
@@ -50,6 +61,7 @@ class Time:
 
 
 class Unit(ABC):
+    __slots__ = ('enemy_killed', 'energy', 'condition', 'location', 'game', 'race')
     condition: Optional[Condition]  # !!
     location: Optional['Location']
     MAX_ENERGY = 127
@@ -106,6 +118,7 @@ class Unit(ABC):
 
 
 class Army(Unit):
+    __slots__ = ('success_chance', 'casualties', 'how_many', 'type')
 
     def __init__(self, game: 'Midnight', race: Race, how_many: int, type: Type) -> None:
         super().__init__(game, race, 88)
@@ -163,31 +176,60 @@ class Army(Unit):
             location = self.get_game().get_map().get_location(x, y)
         else:
             location = x
+        weight = self.get_citadel_weight()
         self.set_location(location)
         self.get_location().set_guard(self)
+        self.get_game().update_doom_darks_citadels(self, weight)
+
+    def get_citadel_weight(self) -> int:
+        if self.get_race() != Race.FOUL or self.get_location() is None:
+            return 0
+        return 5 if self.get_location().get_feature() == Feature.CITADEL else 2
 
     def switch_sides(self) -> None:
+        weight = self.get_citadel_weight()
         if self.get_race() == Race.FOUL:
             self.set_race(Race.FREE)
             self.how_many = 200
         else:
             self.set_race(Race.FOUL)
             self.how_many = 250
+        if self.get_location() is not None and self.get_location().get_guard() is self:
+            self.get_game().get_map().get_occupancy().update_guard(self.get_location())
+        self.get_game().update_doom_darks_citadels(self, weight)
 
     def __str__(self):
         if self.how_many != 0:
             return f"{self.how_many} {self.type}"
         return f"no {self.type}"
 
-    def save(self):
-        raise NotImplementedError()
+    RECORD = struct.Struct('<BBHBhHHh')
+
+    def save(self, ox: BinaryIO) -> None:
+        ox.write(Army.RECORD.pack(self.race.ordinal, Occupancy.get_type_index(self.type), self.how_many, self.energy,
+                                  self.success_chance, self.casualties, self.enemy_killed,
+                                  self.location.get_index() if self.location is not None else NO_LOCATION))
 
     @staticmethod
-    def load():
-        raise NotImplementedError()
+    def load(ix: BinaryIO, game: 'Midnight') -> 'Army':
+        army = Army.__new__(Army)
+        army.read(ix, game)
+        return army
+
+    def read(self, ix: BinaryIO, game: 'Midnight') -> None:
+        race, type, how_many, energy, success_chance, casualties, enemy_killed, location = Army.RECORD.unpack(
+            ix.read(Army.RECORD.size))
+        Army.__init__(self, game, Race.values[race], how_many, Type.RIDERS if type else Type.WARRIORS)
+        self.set_energy(energy)
+        self.success_chance = success_chance
+        self.casualties = casualties
+        self.enemy_killed = enemy_killed
+        # Placement is left to the caller: guards, lords' armies and Doomguard each attach differently.
+        self.location = game.get_map().get_location_at(location) if location != NO_LOCATION else None
 
 
 class Battle:
+    __slots__ = ('free', 'foul', 'characters', 'location', 'winner', 'game', 'random_source')
     characters: set['Character']
     foul: list[Army]
     free: list[Army]
@@ -197,6 +239,7 @@ class Battle:
         self.foul = []
         self.characters = set()
         self.location = location
+        self.random_source = location.get_game().get_battle_random_source(location)
         if winner is None:
             self.winner = winner
         else:
@@ -219,9 +262,13 @@ class Battle:
         if guard.get_race() == Race.FOUL:
             self.append_foul_army(guard)
         else:
-            guard.set_success_chance(0x60 if guard.get_type() == Type.RIDERS else 0x40)
+            guard.set_success_chance(self.calc_guard_chance(guard))
             self.free.append(guard)
 
+    @staticmethod
+    def calc_guard_chance(guard: Army) -> int:
+        return 0x60 if guard.get_type() == Type.RIDERS else 0x40
+
     def append_character(self, character: 'Character') -> None:
         self.characters.add(character)
         character.set_battle(self)
@@ -231,34 +278,40 @@ class Battle:
             self.append_free_army(character.get_warriors(), character)
 
     def append_foul_army(self, army: Army) -> None:
-        fear_factor = self.location.get_ice_fear() // (4 if army.get_type() == Type.RIDERS else 5)
+        army.set_success_chance(self.calc_foul_chance(self.location, army))
+        self.foul.append(army)
+
+    @staticmethod
+    def calc_foul_chance(location: 'Location', army: Army) -> int:
+        fear_factor = location.get_ice_fear() // (4 if army.get_type() == Type.RIDERS else 5)
         success_chance = fear_factor
 
-        if self.location.get_guard() is not None and self.location.get_guard().get_race() == Race.FOUL:
-            success_chance += 0x20 if self.location.get_feature() == Feature.CITADEL else 0x10
+        if location.get_guard() is not None and location.get_guard().get_race() == Race.FOUL:
+            success_chance += 0x20 if location.get_feature() == Feature.CITADEL else 0x10
 
-        army.set_success_chance(success_chance)
-        self.foul.append(army)
+        return success_chance
 
     def append_free_army(self, army: Army, character: 'Character'):
         if army is None or army.get_how_many() == 0:
             return
 
+        army.set_success_chance(self.calc_free_chance(self.location, army, character))
+        self.free.append(army)
+
+    @staticmethod
+    def calc_free_chance(location: 'Location', army: Army, character: 'Character') -> int:
         success_chance = army.get_energy()
 
-        if self.location.get_guard() is not None and self.location.get_guard().get_race() != Race.FOUL:
-            success_chance += 0x20 if self.location.get_feature() == Feature.CITADEL else 0x10
+        if location.get_guard() is not None and location.get_guard().get_race() != Race.FOUL:
+            success_chance += 0x20 if location.get_feature() == Feature.CITADEL else 0x10
 
         if army.get_type() == Type.RIDERS:
-            success_chance += self.location.riders_battle_bonus()
+            success_chance += location.riders_battle_bonus()
 
-        if self.location.get_feature() == Feature.FOREST and character.get_race() == Race.FEY and character.is_on_horse():
+        if location.get_feature() == Feature.FOREST and character.get_race() == Race.FEY and character.is_on_horse():
             success_chance += 0x40
 
-        success_chance = success_chance // 2 + 0x18
-
-        army.set_success_chance(success_chance)
-        self.free.append(army)
+        return success_chance // 2 + 0x18
 
     def run(self) -> None:
         for character in self.characters:
@@ -276,11 +329,14 @@ class Battle:
     def skirmish(self, hits: int, success_chance: int, enemies: list[Army]) -> int:
         enemy_killed = 0
         for i in range(len(enemies)):
-            if self.game.random(256) < success_chance:
-                enemy_index = self.game.random(len(enemies))
+            if self.random(256) < success_chance:
+                enemy_index = self.random(len(enemies))
+                # Midnight.random is inclusive, so a draw of len(enemies) names no army and is drawn again.
+                while enemy_index == len(enemies):
+                    enemy_index = self.random(len(enemies))
                 enemy = enemies[enemy_index]
 
-                if self.game.random(256) > enemy.get_success_chance():
+                if self.random(256) > enemy.get_success_chance():
                     enemy_killed += 5
 
                     enemy.append_casualties(5)
@@ -317,15 +373,21 @@ class Battle:
 
     def what_happened_to_free_lords(self) -> None:
         for character in self.characters:
-            character.maybe_lose()
+            character.maybe_lose(self.random_source)
             if character.is_alive():
                 while True:
-                    direction = Direction.get_direction(self.game.random(8))
+                    rnd = self.random(8)
+                    if rnd == len(Direction.values):
+                        continue
+                    direction = Direction.get_direction(rnd)
                     destination = self.location.get_map().get_in_front(character.get_location(), direction)
                     if destination.get_feature() != Feature.FROZEN_WASTE:
                         break
                 character.set_location(destination)
 
+    def random(self, n: int) -> int:
+        return self.random_source.random(n)
+
     def get_location(self) -> 'Location':
         return self.location
 
@@ -336,8 +398,112 @@ class Battle:
         return f"A battle in the domain of {self.location.get_domain()}"
 
 
+class Change:
+    __slots__ = ('game', 'touched', 'before', 'fields', 'random')
+    slots: dict[type, tuple[str, ...]] = {}
+    FIXED = {'game', 'location', 'id', 'name', 'title', 'riders', 'warriors', 'index', 'characters', 'armies', 'guard',
+             'ice_fear', 'ice_fear_key'}
+    RANDOM_SIZE = 625
+
+    def __init__(self, game: 'Midnight', touched: list[Any], random: bool = False) -> None:
+        self.game = game
+        self.touched = touched
+        self.before = self.capture()
+        self.fields: list[tuple[Any, str, Any, Any]] = []
+        # Only the generator state on the other side of the change is kept; undo and redo swap it with the current one.
+        self.random = game.get_random_source().get_state() if random else None
+
+    @staticmethod
+    def get_slots(cls: type) -> tuple[str, ...]:
+        if cls not in Change.slots:
+            # Characters list their location first so that it moves back through set_location before anything else.
+            names = tuple(name for name in Fork.get_slots(cls) if name not in Change.FIXED)
+            Change.slots[cls] = ('location',) + names if issubclass(cls, Character) else names
+        return Change.slots[cls]
+
+    def capture(self) -> list[tuple]:
+        return [tuple(getattr(unit, name) for name in self.get_slots(type(unit))) for unit in self.touched]
+
+    def finish(self) -> None:
+        for unit, before, after in zip(self.touched, self.before, self.capture()):
+            for name, old, new in zip(self.get_slots(type(unit)), before, after):
+                if old is not new and (type(old) is not type(new) or old != new):
+                    self.fields.append((unit, name, old, new))
+        self.touched = None
+        self.before = None
+        if self.random is not None and self.random == self.game.get_random_source().get_state():
+            self.random = None
+
+    def is_empty(self) -> bool:
+        return len(self.fields) == 0 and self.random is None
+
+    def get_size(self) -> int:
+        return 2 * len(self.fields) + (self.RANDOM_SIZE if self.random is not None else 0)
+
+    def undo(self) -> None:
+        for unit, name, old, _ in self.fields:
+            self.restore(unit, name, old)
+        self.swap_random()
+        self.game.ice_fear_version += 1
+
+    def redo(self) -> None:
+        for unit, name, _, new in self.fields:
+            self.restore(unit, name, new)
+        self.swap_random()
+        self.game.ice_fear_version += 1
+
+    def swap_random(self) -> None:
+        # Changes are undone and redone in stack order, so the generator is always on this change's far side.
+        if self.random is not None:
+            random = self.game.get_random_source()
+            self.random, state = random.get_state(), self.random
+            random.set_state(state)
+
+    @staticmethod
+    def restore(unit: Any, name: str, value: Any) -> None:
+        # Moves and terrain go through their setters so occupancy and movement costs follow along.
+        if name == 'location':
+            unit.set_location(value)
+        elif name == 'feature':
+            unit.set_feature(value)
+        elif name == 'object' and isinstance(unit, Location):
+            unit.set_object(value)
+        else:
+            setattr(unit, name, value)
+
+
+def undoable(touched: Optional[Callable[..., list[Any]]] = None, random: bool = False) -> Callable:
+    def decorate(action: Callable) -> Callable:
+        @wraps(action)
+        def record(self: 'Character', *args):
+            game = self.get_game()
+            if game.changing:
+                return action(self, *args)
+            units = [self, self.time, self.riders, self.warriors, self.location]
+            if touched is not None:
+                units += [unit for unit in touched(self, *args)
+                          if unit is not None and all(unit is not other for other in units)]
+            change = Change(game, units, random)
+            game.changing = True
+            try:
+                result = action(self, *args)
+            finally:
+                game.changing = False
+            change.finish()
+            if not change.is_empty():
+                game.push_change(change)
+            return result
+
+        return record
+
+    return decorate
+
+
 @total_ordering
 class Character(Unit):
+    __slots__ = ('killed', 'found', 'battle', 'recruited', 'hidden', 'strength', 'courage', 'id', 'name', 'title',
+                 'life', 'courage_base', 'recruiting_key', 'recruited_by_key', 'warriors', 'riders', 'direction',
+                 'time', 'object', 'on_horse')
     killed: Optional[Object]
     found: Optional[Object]
     battle: Optional[Battle]
@@ -404,6 +570,7 @@ class Character(Unit):
     def get_direction(self) -> Direction:
         return self.direction
 
+    @undoable()
     def set_direction(self, direction: Direction) -> None:
         self.direction = direction
 
@@ -412,6 +579,7 @@ class Character(Unit):
 
     def die(self) -> None:
         self.life = 0
+        self.get_game().ice_fear_version += 1
 
     def get_strength(self) -> int:
         return self.strength
@@ -425,39 +593,33 @@ class Character(Unit):
     def can_hide(self) -> bool:
         return self != self.get_game().MORKIN and self.get_warriors().get_how_many() == 0 and self.get_riders().get_how_many() == 0
 
+    @undoable()
     def set_hidden(self, hidden: bool) -> None:
         self.hidden = hidden
 
     def can_walk_forward(self) -> bool:
         destination = self.get_game().get_map().get_in_front(self.get_location(), self.direction)
-        return self.can_leave() and not self.time.is_night() and self.get_condition() != Condition.UTTERLY_TIRED and destination.get_feature() != Feature.FROZEN_WASTE and len(
-            destination.get_characters()) < 29 and len(destination.get_armies()) == 0 and (
-                destination.get_guard() is None or destination.get_guard().get_race() != Race.FOUL)
+        occupancy = self.get_game().get_map().get_occupancy()
+        return self.can_leave() and self.can_walk_with(self.time.get_time(), self.get_energy()) and destination.get_feature() != Feature.FROZEN_WASTE and occupancy.get_character_count(
+            destination) < 29 and not occupancy.is_hostile(destination)
+
+    @staticmethod
+    def can_walk_with(time: int, energy: int) -> bool:
+        return time != Time.NIGHT and Condition.get_condition(energy >> 4) != Condition.UTTERLY_TIRED
 
     def can_leave(self) -> bool:
         object = self.get_location().get_object()
-        guard = self.get_location().get_guard()
-        return self.is_alive() and not self.is_hidden() and (self.time.is_dawn() or (
-                len(self.get_location().get_armies()) == 0 and (
-                guard is None or guard.get_race() != Race.FOUL))) and (
-                object not in [Object.DRAGONS, Object.ICE_TROLLS, Object.SKULKRIN, Object.WOLVES])
+        return self.is_alive() and not self.is_hidden() and (
+                self.time.is_dawn() or not self.get_game().get_map().get_occupancy().is_hostile(
+            self.get_location())) and not object.is_beast()
 
+    @undoable(lambda self: [self.get_game().get_map().get_in_front(self.get_location(), self.direction)])
     def walk_forward(self) -> None:
         destination = self.get_game().get_map().get_in_front(self.get_location(), self.direction)
         self.set_location(destination)
 
-        drain = 2
-        if self.direction.is_diagonal():
-            drain += 1
-        if not self.on_horse:
-            drain *= 2
-        if destination.get_feature() == Feature.DOWNS:
-            drain += 1
-        elif destination.get_feature() == Feature.MOUNTAIN:
-            drain += 4
-        elif destination.get_feature() == Feature.FOREST and self.get_race() == Race.FEY:
-            drain += 3
-
+        drain = self.get_game().get_map().get_movement_costs().get_cost(self.get_movement_class(), destination,
+                                                                        self.direction)
         if self == self.get_game().FARFLAME:
             drain = 1
 
@@ -469,6 +631,14 @@ class Character(Unit):
         self.clear_killed()
         self.clear_found()
 
+    def get_reachable(self) -> dict['Location', int]:
+        return self.get_game().get_map().get_reachable(self)
+
+    def get_movement_class(self) -> int:
+        if self.get_race() == Race.FEY:
+            return MovementCosts.FEY_ON_HORSE if self.on_horse else MovementCosts.FEY_ON_FOOT
+        return MovementCosts.LORD_ON_HORSE if self.on_horse else MovementCosts.LORD_ON_FOOT
+
     def get_recruited_by_key(self) -> int:
         return self.recruited_by_key
 
@@ -478,8 +648,9 @@ class Character(Unit):
     def can_recruit(self, c: 'Character') -> bool:
         return not c.is_recruited() and c.get_location() == self.get_location() and (
                 self.recruiting_key & c.recruited_by_key) != 0 and (
-                len(self.get_location().get_armies()) == 0 or self == self.get_game().MORKIN)
+                self.get_game().get_map().get_occupancy().get_army_count(self.get_location()) == 0 or self == self.get_game().MORKIN)
 
+    @undoable(lambda self, c: [c])
     def recruit(self, c: 'Character') -> bool:
         if self.can_recruit(c):
             c.set_recruited(True)
@@ -503,8 +674,9 @@ class Character(Unit):
         return guards is not None and guards.get_race() == self.get_race() and guards.get_how_many() > 125 and (
                 (guards.get_type() == Type.RIDERS and self.get_riders().get_how_many() < 1175) or (
                 guards.get_type() == Type.WARRIORS and self.get_warriors().get_how_many() < 1175)) and (
-                len(self.get_location().get_armies()) == 0 or self == self.get_game().MORKIN)
+                self.get_game().get_map().get_occupancy().get_army_count(self.get_location()) == 0 or self == self.get_game().MORKIN)
 
+    @undoable(lambda self: [self.get_location().get_guard()])
     def recruit_men(self) -> bool:
         if not self.can_recruit_men():
             return False
@@ -523,8 +695,9 @@ class Character(Unit):
         return guards is not None and guards.get_race() == self.get_race() and guards.get_how_many() < 1175 and (
                 (guards.get_type() == Type.RIDERS and self.get_riders().get_how_many() >= 100) or (
                 guards.get_type() == Type.WARRIORS and self.get_warriors().get_how_many() >= 100)) and (
-                len(self.get_location().get_armies()) == 0 or self == self.get_game().MORKIN)
+                self.get_game().get_map().get_occupancy().get_army_count(self.get_location()) == 0 or self == self.get_game().MORKIN)
 
+    @undoable(lambda self: [self.get_location().get_guard()])
     def stand_on_guard(self) -> bool:
         if not self.can_stand_on_guard():
             return False
@@ -553,8 +726,8 @@ class Character(Unit):
     def can_attack(self) -> bool:
         destination = self.get_game().get_map().get_in_front(self.get_location(), self.direction)
 
-        return self.can_leave() and (len(destination.get_armies()) > 0 or (
-                destination.get_guard() is not None and destination.get_guard().get_race() == Race.FOUL)) and self.get_courage() != Courage.UTTERLY_AFRAID
+        return self.can_leave() and self.get_game().get_map().get_occupancy().is_hostile(
+            destination) and self.get_courage() != Courage.UTTERLY_AFRAID
 
     def get_battle(self) -> Battle:
         return self.battle
@@ -616,6 +789,7 @@ class Character(Unit):
     def clear_found(self):
         self.found = None
 
+    @undoable()
     def seek(self) -> Object:
         object = self.get_location().get_object()
         self.found = object
@@ -654,16 +828,17 @@ class Character(Unit):
                 return Object.NOTHING
         return object
 
+    @undoable()
     def drop_object(self) -> None:
         self.get_location().set_object(self.get_object())
         self.set_object(Object.NOTHING)
 
     def can_fight(self) -> bool:
         object = self.get_location().get_object()
-        return not self.is_hidden() and (
-                object in [Object.DRAGONS, Object.ICE_TROLLS, Object.SKULKRIN, Object.WOLVES]) and (
-                len(self.get_location().get_armies()) == 0 or self == self.get_game().MORKIN)
+        return not self.is_hidden() and object.is_beast() and (
+                self.get_game().get_map().get_occupancy().get_army_count(self.get_location()) == 0 or self == self.get_game().MORKIN)
 
+    @undoable(random=True)
     def fight(self) -> None:
         object = self.get_location().get_object()
 
@@ -679,10 +854,12 @@ class Character(Unit):
         self.maybe_lose()
         self.get_location().set_object(Object.NOTHING)
 
-    def maybe_lose(self):
+    def maybe_lose(self, random_source: Optional[RandomSource] = None):
+        if random_source is None:
+            random_source = self.get_game().get_random_source()
         if self.is_on_horse():
-            self.set_on_horse(self.get_game().random(2) == 0)
-        if (self.get_energy() / 2 - 0x40 + self.life) < self.get_game().random(256):
+            self.set_on_horse(random_source.random(2) == 0)
+        if (self.get_energy() / 2 - 0x40 + self.life) < random_source.random(256):
             self.die()
 
     def get_killed(self) -> Object:
@@ -704,18 +881,75 @@ class Character(Unit):
     def __eq__(self, __value):
         return self.id == __value.id
 
-    def save(self):
-        raise NotImplementedError()
+    RECORD = struct.Struct('<BBHHBBBBhBBBBBBBHh')
+    RECRUITED = 0x01
+    HIDDEN = 0x02
+    ON_HORSE = 0x04
+
+    @staticmethod
+    def save_string(ox: BinaryIO, text: str) -> None:
+        data = text.encode()
+        ox.write(bytes([len(data)]) + data)
+
+    @staticmethod
+    def load_string(ix: BinaryIO) -> str:
+        return ix.read(ix.read(1)[0]).decode()
+
+    def save(self, ox: BinaryIO) -> None:
+        flags = (self.RECRUITED if self.recruited else 0) | (self.HIDDEN if self.hidden else 0) | (
+            self.ON_HORSE if self.on_horse else 0)
+        ox.write(Character.RECORD.pack(self.id, self.race.ordinal, self.life, self.strength, self.energy,
+                                       self.courage_base, self.recruiting_key, self.recruited_by_key,
+                                       self.location.get_index(), self.direction.ordinal, self.time.get_time(),
+                                       self.object.ordinal, self.killed.ordinal if self.killed is not None else NONE,
+                                       self.found.ordinal if self.found is not None else NONE,
+                                       self.courage.ordinal if self.courage is not None else NONE, flags,
+                                       self.enemy_killed,
+                                       self.battle.get_location().get_index() if self.battle is not None else NO_LOCATION))
+        self.save_string(ox, self.name)
+        self.save_string(ox, self.title)
+        self.riders.save(ox)
+        self.warriors.save(ox)
 
     @staticmethod
-    def load():
-        raise NotImplementedError()
+    def load(ix: BinaryIO, game: 'Midnight') -> 'Character':
+        id, race, life, strength, energy, courage_base, recruiting_key, recruited_by_key, location, direction, time, \
+            object, killed, found, courage, flags, enemy_killed, battle = Character.RECORD.unpack(
+                ix.read(Character.RECORD.size))
+        character = Character.__new__(Character)
+        Unit.__init__(character, game, Race.values[race], energy)
+        character.id = id
+        character.life = life
+        character.strength = strength
+        character.courage_base = courage_base
+        character.recruiting_key = recruiting_key
+        character.recruited_by_key = recruited_by_key
+        character.direction = Direction.values[direction]
+        character.time = Time(time)
+        character.object = Object.values[object]
+        character.killed = Object.values[killed] if killed != NONE else None
+        character.found = Object.values[found] if found != NONE else None
+        character.courage = Courage.values[courage] if courage != NONE else None
+        character.recruited = (flags & Character.RECRUITED) != 0
+        character.hidden = (flags & Character.HIDDEN) != 0
+        character.on_horse = (flags & Character.ON_HORSE) != 0
+        character.enemy_killed = enemy_killed
+        character.battle = None
+        character.name = Character.load_string(ix)
+        character.title = Character.load_string(ix)
+        character.riders = Army.load(ix, game)
+        character.warriors = Army.load(ix, game)
+        character.set_location(game.get_map().get_location_at(location))
+        if battle != NO_LOCATION:
+            character.battle = game.get_loaded_battle(game.get_map().get_location_at(battle))
+        return character
 
     def update(self):
         raise NotImplementedError
 
 
 class Doomguard(Army):
+    __slots__ = ('move_count', 'orders', 'target', 'id')
     MAX_MOVE_COUNT = 6
     next_id = 0
 
@@ -762,7 +996,7 @@ class Doomguard(Army):
             if location.is_special():
                 self.move_to(self.get_game().get_map().get_in_front(self.get_location(), direction))
                 return
-            direction = direction.turn_right()
+            direction = Direction.TURN_RIGHT[direction.ordinal]
 
         if self.orders == Orders.FOLLOW:
             self.follow_character()
@@ -802,8 +1036,11 @@ class Doomguard(Army):
 
     def wander(self) -> None:
         while True:
-            location = self.get_game().get_map().get_in_front(self.get_location(),
-                                                              Direction.get_direction(self.get_game().random(8)))
+            rnd = self.get_game().random(8)
+            # Midnight.random is inclusive, so a draw of 8 names no direction and is drawn again.
+            if rnd == len(Direction.values):
+                continue
+            location = self.get_game().get_map().get_in_front(self.get_location(), Direction.get_direction(rnd))
             if location.get_feature() != Feature.FROZEN_WASTE:
                 break
         self.move_to(location)
@@ -811,23 +1048,31 @@ class Doomguard(Army):
     def move_towards(self, location: 'Location') -> None:
         if self.get_location() != location:
             direction = Map.calc_direction(self.get_location(), location)
+            # Midnight.random is inclusive, so a draw of 4 keeps the previous candidate, if there is one.
+            destination = None
             for i in range(8):
                 rnd = self.get_game().random(4)
                 if rnd in [0, 1]:
                     destination = self.get_game().get_map().get_in_front(self.get_location(), direction)
                 elif rnd == 2:
-                    destination = self.get_game().get_map().get_in_front(self.get_location(), direction.turn_left())
+                    destination = self.get_game().get_map().get_in_front(self.get_location(),
+                                                                          Direction.TURN_LEFT[direction.ordinal])
                 elif rnd == 3:
-                    destination = self.get_game().get_map().get_in_front(self.get_location(), direction.turn_right())
-                if destination.get_feature() not in [Feature.FOREST, Feature.MOUNTAIN, Feature.FROZEN_WASTE]:
+                    destination = self.get_game().get_map().get_in_front(self.get_location(),
+                                                                          Direction.TURN_RIGHT[direction.ordinal])
+                if destination is not None and destination.get_feature() not in [Feature.FOREST, Feature.MOUNTAIN,
+                                                                                  Feature.FROZEN_WASTE]:
                     break
-            if destination.get_feature() != Feature.FROZEN_WASTE:
+            if destination is not None and destination.get_feature() != Feature.FROZEN_WASTE:
                 self.move_to(destination)
             else:
                 self.stop_moving()
         else:
             self.stop_moving()
 
+    def get_movement_class(self) -> int:
+        return MovementCosts.DOOMGUARD_RIDERS if self.get_type() == Type.RIDERS else MovementCosts.DOOMGUARD_WARRIORS
+
     def stop_moving(self) -> None:
         self.move_count = self.MAX_MOVE_COUNT
 
@@ -838,43 +1083,134 @@ class Doomguard(Army):
         self.move_count = 0
 
     def move_to(self, location: 'Location') -> None:
-        if len(location.get_armies()) > 0x1f:
+        if self.get_game().get_map().get_occupancy().get_army_count(location) > 0x1f:
             self.stop_moving()
             return
-        cost = 8 if location.get_feature() in [Feature.FOREST, Feature.MOUNTAIN] else 2
-        if self.get_type() == Type.RIDERS:
-            cost /= 2
-        self.move_count += cost
+        self.move_count += self.get_game().get_map().get_movement_costs().get_cost(self.get_movement_class(), location,
+                                                                                   Direction.NORTH)
         self.set_location(location)
 
-    def save(self):
-        raise NotImplementedError()
+    RECORD = struct.Struct('<HBBBh')
+    NO_TARGET = 0
+    CHARACTER_TARGET = 1
+    LOCATION_TARGET = 2
+
+    def save(self, ox: BinaryIO) -> None:
+        super().save(ox)
+        if isinstance(self.target, Character):
+            kind, target = self.CHARACTER_TARGET, self.target.get_id()
+        elif isinstance(self.target, Location):
+            kind, target = self.LOCATION_TARGET, self.target.get_index()
+        else:
+            kind, target = self.NO_TARGET, 0
+        # Ids are written relative to the game's first Doomguard, since the id counter is shared by every game.
+        ox.write(Doomguard.RECORD.pack(self.id - self.get_game().doomguard_base, self.move_count, self.orders.ordinal,
+                                       kind, target))
 
     @staticmethod
-    def load():
-        raise NotImplementedError()
+    def load(ix: BinaryIO, game: 'Midnight') -> 'Doomguard':
+        army = Doomguard.__new__(Doomguard)
+        army.read(ix, game)
+        id, move_count, orders, kind, target = Doomguard.RECORD.unpack(ix.read(Doomguard.RECORD.size))
+        army.id = game.doomguard_base + id
+        army.move_count = move_count
+        army.orders = Orders.values[orders]
+        if kind == Doomguard.CHARACTER_TARGET:
+            army.target = next(character for character in game.characters if character.get_id() == target)
+        elif kind == Doomguard.LOCATION_TARGET:
+            army.target = game.get_map().get_location_at(target)
+        else:
+            army.target = None
+        location = army.location
+        army.location = None
+        army.set_location(location)
+        Doomguard.next_id = max(Doomguard.next_id, army.id + 1)
+        return army
+
+
+class Terrain:
+    instance: Optional['Terrain'] = None
+
+    def __init__(self) -> None:
+        xs = []
+        ys = []
+        features = []
+        objects = []
+        areas = []
+        domains = []
+        specials = []
+        for i in range(len(mainMap)):
+            xs.append(i % Map.WIDTH)
+            ys.append(i // Map.WIDTH)
+            features.append(Feature.get_feature(mainMap[i] & 0x0f))
+            objects.append(Object.get_object(mainMap[i] >> 4))
+            areas.append(Area.get_area(referenceDescriptionMap[i] & 0x3f))
+            domains.append((referenceDescriptionMap[i] & 0x40) != 0)
+            specials.append((referenceDescriptionMap[i] & 0x80) != 0)
+
+        # The trailing entry describes the frozen wastes beyond the edge of the map, whose index is -1.
+        xs.append(-1)
+        ys.append(-1)
+        features.append(Feature.FROZEN_WASTE)
+        objects.append(Object.NOTHING)
+        areas.append(Area.NOTHING)
+        domains.append(False)
+        specials.append(False)
+
+        self.xs = tuple(xs)
+        self.ys = tuple(ys)
+        self.features = tuple(features)
+        self.objects = tuple(objects)
+        self.areas = tuple(areas)
+        self.domains = tuple(domains)
+        self.specials = tuple(specials)
+
+    @staticmethod
+    def get_instance() -> 'Terrain':
+        if Terrain.instance is None:
+            Terrain.instance = Terrain()
+        return Terrain.instance
+
+    def size(self) -> int:
+        return len(self.xs) - 1
 
 
 class Location:
-    characters: set[Character]
-    armies: set[Army]
+    __slots__ = ('ice_fear', 'ice_fear_key', 'characters', 'armies', 'guard', 'game', 'index', 'feature', 'object',
+                 'special')
+    characters: Optional[set[Character]]
+    armies: Optional[set[Army]]
     guard: Optional[Army]
+    NO_UNITS = frozenset()
 
-    def __init__(self, game: Optional['Midnight'], x: int, y: int, feature: Feature, object: Object, area: Area,
-                 domain: bool,
-                 special: bool) -> None:
+    def __init__(self, game: Optional['Midnight'], index: int) -> None:
+        terrain = Terrain.get_instance()
         self.ice_fear = 0
-        self.characters = set()
-        self.armies = set()
+        self.ice_fear_key = None
+        self.characters = None
+        self.armies = None
         self.guard = None
         self.game = game
-        self.x = x
-        self.y = y
-        self.feature = feature
-        self.object = object
-        self.area = area
-        self.domain = domain
-        self.special = special
+        self.index = index
+        self.feature = terrain.features[index]
+        self.object = terrain.objects[index]
+        self.special = terrain.specials[index]
+
+    @property
+    def x(self) -> int:
+        return Terrain.instance.xs[self.index]
+
+    @property
+    def y(self) -> int:
+        return Terrain.instance.ys[self.index]
+
+    @property
+    def area(self) -> Area:
+        return Terrain.instance.areas[self.index]
+
+    @property
+    def domain(self) -> bool:
+        return Terrain.instance.domains[self.index]
 
     def get_coordinates(self) -> str:
         return f" [{self.x}, {self.y}]"
@@ -898,6 +1234,9 @@ class Location:
     def get_y(self) -> int:
         return self.y
 
+    def get_index(self) -> int:
+        return self.index
+
     def get_map(self) -> 'Map':
         return self.game.get_map()
 
@@ -913,6 +1252,11 @@ class Location:
     def get_feature(self) -> Feature:
         return self.feature
 
+    def set_feature(self, feature: Feature) -> None:
+        previous = self.feature
+        self.feature = feature
+        self.get_map().get_movement_costs().update(self, previous)
+
     def get_domain(self) -> Area:
         return self.area
 
@@ -924,6 +1268,7 @@ class Location:
 
     def set_object(self, object: Object) -> None:
         self.object = object
+        self.get_map().object_version += 1
 
     def is_special(self) -> bool:
         return self.special
@@ -937,36 +1282,49 @@ class Location:
     def set_guard(self, guard: Army) -> None:
         if self.feature in [Feature.KEEP, Feature.CITADEL]:
             self.guard = guard
+            self.get_map().get_occupancy().update_guard(self)
 
     def get_armies(self) -> set[Army]:
-        return self.armies
+        return self.armies if self.armies is not None else self.NO_UNITS
 
     def append_army(self, army: Army) -> None:
+        if self.armies is None:
+            self.armies = set()
         self.armies.add(army)
+        self.get_map().get_occupancy().append_army(self, army)
         if self.feature == Feature.PLAINS:
-            self.feature = Feature.ARMY
+            self.set_feature(Feature.ARMY)
 
     def remove_army(self, army: Army) -> None:
         self.armies.remove(army)
-        if self.feature == Feature.ARMY and len(self.armies) == 0:
-            self.feature = Feature.PLAINS
+        self.get_map().get_occupancy().remove_army(self, army)
+        if len(self.armies) == 0:
+            self.armies = None
+            if self.feature == Feature.ARMY:
+                self.set_feature(Feature.PLAINS)
 
     def get_characters(self) -> set[Character]:
-        return self.characters
+        return self.characters if self.characters is not None else self.NO_UNITS
 
     def append_character(self, character: Character) -> None:
+        if self.characters is None:
+            self.characters = set()
         self.characters.add(character)
+        self.get_map().get_occupancy().append_character(self, character)
         if self.feature == Feature.PLAINS and (
                 character.get_riders().get_how_many() > 0 or character.get_warriors().get_how_many() > 0):
-            self.feature = Feature.ARMY
+            self.set_feature(Feature.ARMY)
 
     def remove_character(self, character: Character) -> None:
         self.characters.remove(character)
+        self.get_map().get_occupancy().remove_character(self, character)
+        if len(self.characters) == 0:
+            self.characters = None
         if self.feature == Feature.ARMY:
-            for c in self.characters:
+            for c in self.get_characters():
                 if c.get_warriors().get_how_many() > 0 or c.get_riders().get_how_many() > 0:
                     return
-            self.feature = Feature.PLAINS
+            self.set_feature(Feature.PLAINS)
 
     def riders_battle_bonus(self) -> int:
         return 0x20 if self.feature == Feature.MOUNTAIN else 0x40
@@ -975,14 +1333,31 @@ class Location:
     def capitalize(o: Any) -> str:
         return str(o).capitalize()
 
-    def save(self):
-        raise NotImplementedError()
+    RECORD = struct.Struct('<HBBB')
+
+    def is_changed(self) -> bool:
+        terrain = Terrain.get_instance()
+        return self.feature != terrain.features[self.index] or self.object != terrain.objects[self.index] or \
+            self.special != terrain.specials[self.index]
+
+    def save(self, ox: BinaryIO) -> None:
+        ox.write(Location.RECORD.pack(self.index, self.feature.ordinal, self.object.ordinal, self.special))
 
     @staticmethod
-    def load():
-        raise NotImplementedError()
+    def load(ix: BinaryIO, map: 'Map') -> 'Location':
+        index, feature, object, special = Location.RECORD.unpack(ix.read(Location.RECORD.size))
+        location = map.get_location_at(index)
+        location.set_feature(Feature.values[feature])
+        location.set_object(Object.values[object])
+        location.set_special(bool(special))
+        return location
 
     def get_ice_fear(self) -> int:
+        key = (self.game.ice_fear_version, self.get_map().get_occupancy().get_version())
+        if self.ice_fear_key == key:
+            return self.ice_fear
+        self.ice_fear_key = key
+
         if self.game.MORKIN.is_alive():
             if Map.calc_distance(self, self.game.MORKIN.get_location()) == 0:
                 self.ice_fear = 0x1ff - Map.calc_distance(self, self.get_map().TOWER_OF_DESPAIR) * 4
@@ -1004,10 +1379,11 @@ class Location:
 
 
 class FrozenWaste(Location):
-    instance: 'FrozenWaste'
+    __slots__ = ()
+    instance: Optional['FrozenWaste'] = None
 
     def __init__(self) -> None:
-        super().__init__(None, -1, -1, Feature.FROZEN_WASTE, Object.NOTHING, Area.NOTHING, False, False)
+        super().__init__(None, -1)
 
     @staticmethod
     def get_instance() -> Location:
@@ -1016,54 +1392,384 @@ class FrozenWaste(Location):
         return FrozenWaste.instance
 
 
+class Occupancy:
+    ARMIES = 0x01
+    FOUL_GUARD = 0x02
+    HOSTILE = ARMIES | FOUL_GUARD
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.characters = bytearray(size)
+        self.races = bytearray(size * len(Race.values))
+        self.armies = bytearray(size)
+        self.types = bytearray(2 * size)
+        self.flags = bytearray(size)
+        self.touched = set()
+        self.version = 0
+
+    @staticmethod
+    def get_type_index(type: Type) -> int:
+        return 0 if type == Type.WARRIORS else 1
+
+    def append_character(self, location: 'Location', character: Character) -> None:
+        self.update_character(location.get_index(), character, 1)
+
+    def remove_character(self, location: 'Location', character: Character) -> None:
+        self.update_character(location.get_index(), character, -1)
+
+    def update_character(self, index: int, character: Character, delta: int) -> None:
+        if index < 0:
+            return
+        self.characters[index] += delta
+        self.races[index * len(Race.values) + character.get_race().get_index()] += delta
+        self.touched.add(index)
+        self.version += 1
+
+    def append_army(self, location: 'Location', army: Army) -> None:
+        self.update_army(location.get_index(), army, 1)
+
+    def remove_army(self, location: 'Location', army: Army) -> None:
+        self.update_army(location.get_index(), army, -1)
+
+    def update_army(self, index: int, army: Army, delta: int) -> None:
+        if index < 0:
+            return
+        self.armies[index] += delta
+        self.types[index * 2 + self.get_type_index(army.get_type())] += delta
+        if self.armies[index] > 0:
+            self.flags[index] |= self.ARMIES
+        else:
+            self.flags[index] &= ~self.ARMIES
+        self.touched.add(index)
+        self.version += 1
+
+    def update_guard(self, location: 'Location') -> None:
+        index = location.get_index()
+        if index < 0:
+            return
+        guard = location.get_guard()
+        if guard is not None and guard.get_race() == Race.FOUL:
+            self.flags[index] |= self.FOUL_GUARD
+        else:
+            self.flags[index] &= ~self.FOUL_GUARD
+        self.touched.add(index)
+        self.version += 1
+
+    def get_character_count(self, location: 'Location') -> int:
+        return self.characters[location.get_index()] if location.get_index() >= 0 else 0
+
+    def get_race_count(self, location: 'Location', race: Race) -> int:
+        if location.get_index() < 0:
+            return 0
+        return self.races[location.get_index() * len(Race.values) + race.get_index()]
+
+    def get_army_count(self, location: 'Location') -> int:
+        return self.armies[location.get_index()] if location.get_index() >= 0 else 0
+
+    def get_type_count(self, location: 'Location', type: Type) -> int:
+        if location.get_index() < 0:
+            return 0
+        return self.types[location.get_index() * 2 + self.get_type_index(type)]
+
+    def is_hostile(self, location: 'Location') -> bool:
+        return location.get_index() >= 0 and (self.flags[location.get_index()] & self.HOSTILE) != 0
+
+    def get_version(self) -> int:
+        return self.version
+
+    def fork(self) -> 'Occupancy':
+        occupancy = Occupancy.__new__(Occupancy)
+        occupancy.size = self.size
+        occupancy.characters = bytearray(self.characters)
+        occupancy.races = bytearray(self.races)
+        occupancy.armies = bytearray(self.armies)
+        occupancy.types = bytearray(self.types)
+        occupancy.flags = bytearray(self.flags)
+        occupancy.touched = set(self.touched)
+        occupancy.version = self.version
+        return occupancy
+
+    def take_touched(self) -> set[int]:
+        touched = self.touched
+        self.touched = set()
+        return touched
+
+
+class MovementCosts:
+    LORD_ON_HORSE = 0
+    LORD_ON_FOOT = 1
+    FEY_ON_HORSE = 2
+    FEY_ON_FOOT = 3
+    DOOMGUARD_RIDERS = 4
+    DOOMGUARD_WARRIORS = 5
+    CLASSES = 6
+    shared_grids: Optional[tuple[bytearray, ...]] = None
+
+    def __init__(self) -> None:
+        if MovementCosts.shared_grids is None:
+            MovementCosts.shared_grids = self.calc_grids(Terrain.get_instance().features)
+        self.grids = list(MovementCosts.shared_grids)
+        self.owned = [False] * self.CLASSES
+
+    def fork(self) -> 'MovementCosts':
+        # Both sides give up ownership of their grids, so whichever changes a feature first makes its own copy.
+        self.owned = [False] * self.CLASSES
+        costs = MovementCosts.__new__(MovementCosts)
+        costs.grids = list(self.grids)
+        costs.owned = [False] * self.CLASSES
+        return costs
+
+    @staticmethod
+    def get_cost_group(feature: Feature) -> int:
+        if feature == Feature.DOWNS:
+            return 1
+        if feature == Feature.MOUNTAIN:
+            return 2
+        if feature == Feature.FOREST:
+            return 3
+        return 0
+
+    @staticmethod
+    def calc_cost(movement_class: int, feature: Feature, direction: Direction) -> int:
+        if movement_class >= MovementCosts.DOOMGUARD_RIDERS:
+            cost = 8 if feature in [Feature.FOREST, Feature.MOUNTAIN] else 2
+            return cost // 2 if movement_class == MovementCosts.DOOMGUARD_RIDERS else cost
+
+        drain = 3 if Direction.DIAGONAL[direction.ordinal] else 2
+        if movement_class in [MovementCosts.LORD_ON_FOOT, MovementCosts.FEY_ON_FOOT]:
+            drain *= 2
+        if feature == Feature.DOWNS:
+            drain += 1
+        elif feature == Feature.MOUNTAIN:
+            drain += 4
+        elif feature == Feature.FOREST and movement_class in [MovementCosts.FEY_ON_HORSE, MovementCosts.FEY_ON_FOOT]:
+            drain += 3
+        return drain
+
+    def calc_grids(self, features: tuple[Feature, ...]) -> tuple[bytearray, ...]:
+        cells = Terrain.get_instance().size()
+        grids = []
+        for movement_class in range(self.CLASSES):
+            costs = {feature: bytes(self.calc_cost(movement_class, feature, direction) for direction in Direction.values)
+                     for feature in Feature.values}
+            grids.append(bytearray(b''.join(costs[features[index]] for index in range(cells))))
+        return tuple(grids)
+
+    def get_cost(self, movement_class: int, location: 'Location', direction: Direction) -> int:
+        if location.get_index() < 0:
+            return self.calc_cost(movement_class, location.get_feature(), direction)
+        return self.grids[movement_class][location.get_index() * len(Direction.values) + direction.ordinal]
+
+    def update(self, location: 'Location', previous: Feature) -> None:
+        if location.get_index() < 0 or self.get_cost_group(previous) == self.get_cost_group(location.get_feature()):
+            return
+        for movement_class in range(self.CLASSES):
+            if not self.owned[movement_class]:
+                self.grids[movement_class] = bytearray(self.grids[movement_class])
+                self.owned[movement_class] = True
+            for direction in Direction.values:
+                self.grids[movement_class][location.get_index() * len(Direction.values) + direction.ordinal] = \
+                    self.calc_cost(movement_class, location.get_feature(), direction)
+
+
+class Fork:
+    slots: dict[type, tuple[str, ...]] = {}
+
+    def __init__(self, game: 'Midnight') -> None:
+        self.game = game
+        self.clones: dict[int, Any] = {}
+
+    @staticmethod
+    def get_slots(cls: type) -> tuple[str, ...]:
+        if cls not in Fork.slots:
+            Fork.slots[cls] = tuple(name for klass in cls.__mro__ for name in vars(klass).get('__slots__', ()))
+        return Fork.slots[cls]
+
+    def clone(self, original: Any) -> Any:
+        clone = object.__new__(type(original))
+        for name in self.get_slots(type(original)):
+            try:
+                setattr(clone, name, getattr(original, name))
+            except AttributeError:
+                pass
+        self.clones[id(original)] = clone
+        return clone
+
+    def get(self, original: Any) -> Any:
+        return self.clones.get(id(original), original)
+
+
+class ThreatField:
+    UNREACHED = 1 << 16
+
+    def __init__(self, game: 'Midnight') -> None:
+        self.size = Map.WIDTH * Map.HEIGHT
+        self.values = np.zeros(self.size, dtype=np.int64)
+        costs = game.get_map().get_movement_costs()
+        for movement_class in [MovementCosts.DOOMGUARD_RIDERS, MovementCosts.DOOMGUARD_WARRIORS]:
+            numbers = {}
+            for doomguard in game.doomguard:
+                if doomguard.get_movement_class() == movement_class:
+                    index = doomguard.get_location().get_index()
+                    numbers[index] = numbers.get(index, 0) + doomguard.get_how_many()
+            if numbers:
+                self.add_reached(costs.grids[movement_class], numbers, Doomguard.MAX_MOVE_COUNT)
+        for army in game.armies:
+            if army.get_race() == Race.FOUL and army.get_location().get_index() >= 0:
+                self.values[army.get_location().get_index()] += army.get_how_many()
+        self.peak = int(self.values.max())
+
+    def add_reached(self, grid: bytearray, numbers: dict[int, int], budget: int) -> None:
+        # Every step costs at least one, so nothing leaves the square of radius budget around its source. The costs
+        # are relaxed in those squares for all sources at once, one step in every direction per pass, on a map
+        # padded with frozen waste. A cell is reached when a move into it starts below the budget, so the last step
+        # may overshoot it.
+        side = 2 * budget + 1
+        shape = (Map.HEIGHT + 2 * budget, Map.WIDTH + 2 * budget)
+        entry = np.full(shape + (len(Direction.values),), self.UNREACHED, dtype=np.int32)
+        inner = entry[budget:budget + Map.HEIGHT, budget:budget + Map.WIDTH]
+        inner[...] = np.frombuffer(bytes(grid[:self.size * len(Direction.values)]), dtype=np.uint8).reshape(
+            inner.shape)
+        features = Terrain.get_instance().features[:self.size]
+        inner[np.array([feature == Feature.FROZEN_WASTE for feature in features]).reshape(inner.shape[:2])] = \
+            self.UNREACHED
+
+        sources = np.array(list(numbers), dtype=np.int32)
+        rows = (sources // Map.WIDTH)[:, None, None] + np.arange(side)[None, :, None]
+        columns = (sources % Map.WIDTH)[:, None, None] + np.arange(side)[None, None, :]
+        entry = entry[rows, columns]
+        costs = np.full((len(sources), side, side), self.UNREACHED, dtype=np.int32)
+        costs[:, budget, budget] = 0
+        while True:
+            moving = np.where(costs < budget, costs, self.UNREACHED)
+            relaxed = costs.copy()
+            for direction in Direction.values:
+                dx = direction.get_x_adjustment()
+                dy = direction.get_y_adjustment()
+                into = (slice(None), slice(max(dy, 0), side + min(dy, 0)), slice(max(dx, 0), side + min(dx, 0)))
+                out_of = (slice(None), slice(max(-dy, 0), side + min(-dy, 0)), slice(max(-dx, 0), side + min(-dx, 0)))
+                np.minimum(relaxed[into], moving[out_of] + entry[into + (direction.ordinal,)], out=relaxed[into])
+            if np.array_equal(relaxed, costs):
+                break
+            costs = relaxed
+
+        reached = costs < self.UNREACHED
+        cells = (rows - budget) * Map.WIDTH + columns - budget
+        weights = np.broadcast_to(np.array(list(numbers.values()), dtype=np.int64)[:, None, None], reached.shape)
+        self.values += np.bincount(cells[reached], weights=weights[reached], minlength=self.size).astype(np.int64)
+
+    def get_threat(self, location: 'Location') -> int:
+        return int(self.values[location.get_index()]) if location.get_index() >= 0 else 0
+
+    def get_peak(self) -> int:
+        return self.peak
+
+    def get_threatened(self) -> Iterator[tuple[int, int, int]]:
+        for index in np.flatnonzero(self.values > 0).tolist():
+            yield index % Map.WIDTH, index // Map.WIDTH, int(self.values[index])
+
+
+class RouteGraph:
+    instance: Optional['RouteGraph'] = None
+    UNREACHABLE = -1
+
+    def __init__(self) -> None:
+        self.size = len(routes)
+        self.nodes = {(route[0], route[1]): i for i, route in enumerate(routes)}
+        self.next_a = tuple(route[2] for route in routes)
+        self.next_b = tuple(route[3] for route in routes)
+        self.distance = [[self.UNREACHABLE] * self.size for _ in range(self.size)]
+        for source in range(self.size):
+            self.calc_shortest_paths(source)
+
+    @staticmethod
+    def get_instance() -> 'RouteGraph':
+        if RouteGraph.instance is None:
+            RouteGraph.instance = RouteGraph()
+        return RouteGraph.instance
+
+    @staticmethod
+    def calc_steps(a: int, b: int) -> int:
+        return max(abs(routes[a][0] - routes[b][0]), abs(routes[a][1] - routes[b][1]))
+
+    def calc_shortest_paths(self, source: int) -> None:
+        distance = self.distance[source]
+        distance[source] = 0
+        queue = [(0, source)]
+        while queue:
+            steps, node = heapq.heappop(queue)
+            if steps > distance[node]:
+                continue
+            for neighbour in (self.next_a[node], self.next_b[node]):
+                candidate = steps + self.calc_steps(node, neighbour)
+                if distance[neighbour] == self.UNREACHABLE or candidate < distance[neighbour]:
+                    distance[neighbour] = candidate
+                    heapq.heappush(queue, (candidate, neighbour))
+
+    def get_node_index(self, x: int, y: int) -> int:
+        return self.nodes.get((x, y), self.UNREACHABLE)
+
+    def get_distance(self, a: int, b: int) -> int:
+        return self.distance[a][b]
+
+
 class Map:
-    routeNodes: dict[Location, int]
-    locations: list[list[Optional[Location]]]
+    route_nodes: Optional[dict[Location, int]]
+    locations: dict[int, Location]
     TOWER_OF_DESPAIR: Location
+    WIDTH = 64
+    HEIGHT = 61
+    rings: list[tuple[tuple[int, int], ...]] = []
 
     def __init__(self, game: 'Midnight') -> None:
         self.game = game
-        self.locations = [[None for _ in range(61)] for _ in range(64)]
-        i = 0
-        for y in range(self.height()):
-            for x in range(self.width()):
-                feature = Feature.get_feature(mainMap[i] & 0x0f)
-                object = Object.get_object(mainMap[i] >> 4)
-
-                area = Area.get_area(referenceDescriptionMap[i] & 0x3f)
-                domain = (referenceDescriptionMap[i] & 0x40) != 0
-                special = (referenceDescriptionMap[i] & 0x80) != 0
-                self.locations[x][y] = Location(game, x, y, feature, object, area, domain, special)
-                i += 1
+        self.occupancy = Occupancy(self.WIDTH * self.HEIGHT)
+        self.movement_costs = MovementCosts()
+        self.query_cache = {}
+        self.query_key = None
+        self.object_version = 0
+        self.threat = None
+        self.threat_day = -1
+        self.locations = {}
+        self.route_nodes = None
         self.TOWER_OF_DESPAIR = self.get_location(26, 4)
         self.XAJORKITH = self.get_location(45, 59)
         self.USHGARAK = self.get_location(29, 7)
         self.LAKE_MIRROW = self.get_location(9, 17)
+        self.route_graph = RouteGraph.get_instance()
 
-        self.routeNodes = {}
-        for i in range(len(routes)):
-            self.routeNodes[self.locations[routes[i][0]][routes[i][1]]] = i
+    @property
+    def routeNodes(self) -> dict[Location, int]:
+        if self.route_nodes is None:
+            self.route_nodes = {self.get_route_node(i): i for i in range(len(routes))}
+        return self.route_nodes
 
     def width(self) -> int:
-        return len(self.locations)
+        return self.WIDTH
 
     def height(self) -> int:
-        return len(self.locations[0])
+        return self.HEIGHT
+
+    def get_location_at(self, index: int) -> Location:
+        location = self.locations.get(index)
+        if location is None:
+            if index < 0:
+                return FrozenWaste.get_instance()
+            location = Location(self.game, index)
+            self.locations[index] = location
+        return location
 
     def get_location(self, x: int, y: int) -> Location:
-        if x < 0 or y < 0 or x >= self.width() or y >= self.height():
+        if x < 0 or y < 0 or x >= self.WIDTH or y >= self.HEIGHT:
             return FrozenWaste.get_instance()
-        return self.locations[x][y]
+        return self.get_location_at(y * self.WIDTH + x)
 
     def set_location(self, l: Location) -> None:
-        self.locations[l.get_x()][l.get_y()] = l
+        self.locations[l.get_index()] = l
 
     def get_in_front(self, location: Location, direction: Direction) -> Location:
-        x = location.get_x() + direction.get_x_adjustment()
-        y = location.get_y() + direction.get_y_adjustment()
-        if x < 0 or x >= self.width() or y < 0 or y >= self.height():
-            return FrozenWaste.get_instance()
-        return self.locations[x][y]
+        return self.get_location(location.get_x() + direction.get_x_adjustment(),
+                                 location.get_y() + direction.get_y_adjustment())
 
     def get_looking_towards(self, location: Location, direction: Direction) -> Location:
         for i in range(3):
@@ -1073,50 +1779,196 @@ class Map:
 
         return location
 
+    @staticmethod
+    def get_ring(radius: int) -> tuple[tuple[int, int], ...]:
+        while len(Map.rings) <= radius:
+            distance = len(Map.rings)
+            if distance == 0:
+                Map.rings.append(((0, 0),))
+                continue
+            ring = []
+            for i in range(distance):
+                ring.append((distance - i, i))
+                ring.append((-i, distance - i))
+                ring.append((i - distance, -i))
+                ring.append((i, i - distance))
+            Map.rings.append(tuple(ring))
+        return Map.rings[radius]
+
+    def get_indices_within(self, location: Location, radius: int) -> Iterator[int]:
+        for distance in range(radius + 1):
+            for dx, dy in self.get_ring(distance):
+                x = location.get_x() + dx
+                y = location.get_y() + dy
+                if 0 <= x < self.WIDTH and 0 <= y < self.HEIGHT:
+                    yield y * self.WIDTH + x
+
+    def get_locations_within(self, location: Location, radius: int) -> Iterator[Location]:
+        for index in self.get_indices_within(location, radius):
+            yield self.get_location_at(index)
+
+    def peek_location_at(self, index: int) -> Location:
+        # Untouched cells are described by a throwaway Location so that scans do not materialize them.
+        location = self.locations.get(index)
+        return location if location is not None else Location(self.game, index)
+
+    def get_cached_query(self, key: tuple, query: Callable[[], Any]) -> Any:
+        query_key = (self.game.get_day(), self.occupancy.get_version(), self.object_version)
+        if self.query_key != query_key:
+            self.query_cache.clear()
+            self.query_key = query_key
+        if key not in self.query_cache:
+            self.query_cache[key] = query()
+        return self.query_cache[key]
+
+    def units_within(self, location: Location, radius: int) -> list[Unit]:
+        return self.get_cached_query(('units', location.get_index(), radius),
+                                     lambda: self.find_units_within(location, radius))
+
+    def find_units_within(self, location: Location, radius: int) -> list[Unit]:
+        units = []
+        for index in self.get_indices_within(location, radius):
+            # Placing a unit materializes its cell, so an untouched cell is empty.
+            candidate = self.locations.get(index)
+            if candidate is None:
+                continue
+            if self.occupancy.get_character_count(candidate) > 0:
+                units.extend(sorted(candidate.get_characters()))
+            if self.occupancy.get_army_count(candidate) > 0:
+                units.extend(candidate.get_armies())
+            if candidate.get_guard() is not None:
+                units.append(candidate.get_guard())
+        return units
+
+    def features_within(self, location: Location, radius: int, feature: Feature) -> list[Location]:
+        return self.get_cached_query(('features', location.get_index(), radius, feature),
+                                     lambda: self.find_features_within(location, radius, feature))
+
+    def find_features_within(self, location: Location, radius: int, feature: Feature) -> list[Location]:
+        features = Terrain.get_instance().features
+        found = []
+        for index in self.get_indices_within(location, radius):
+            candidate = self.locations.get(index)
+            if (candidate.get_feature() if candidate is not None else features[index]) == feature:
+                found.append(candidate if candidate is not None else self.get_location_at(index))
+        return found
+
+    def nearest(self, location: Location, predicate: Callable[[Location], bool],
+                max_radius: int = WIDTH + HEIGHT) -> Optional[Location]:
+        for index in self.get_indices_within(location, max_radius):
+            if predicate(self.peek_location_at(index)):
+                return self.get_location_at(index)
+        return None
+
+    def get_threat(self) -> ThreatField:
+        if self.threat is None or self.threat_day != self.game.get_day():
+            self.threat = ThreatField(self.game)
+            self.threat_day = self.game.get_day()
+        return self.threat
+
+    def get_reachable(self, character: Character) -> dict[Location, int]:
+        key = ('reachable', character.get_id(), character.get_location().get_index(),
+               character.get_time().get_time(), character.get_energy(), character.is_on_horse(),
+               character.is_hidden(), character.is_alive())
+        return self.get_cached_query(key, lambda: self.calc_reachable(character))
+
+    def calc_reachable(self, character: Character) -> dict[Location, int]:
+        start = character.get_location()
+        time = character.get_time().get_time()
+        energy = character.get_energy()
+        if not character.is_alive() or character.is_hidden():
+            return {start: time}
+
+        # The search runs on cell indices and reads Terrain and the occupancy arrays directly, so only the cells it
+        # returns are turned into Locations.
+        terrain = Terrain.get_instance()
+        grid = self.movement_costs.grids[character.get_movement_class()]
+        farflame = character == self.game.FARFLAME
+        drains = {start.get_index(): 0}
+        queue = [(0, start.get_index())]
+        while queue:
+            drain, index = heapq.heappop(queue)
+            if drain > drains[index]:
+                continue
+            time_left = max(time - drain, Time.NIGHT)
+            if not character.can_walk_with(time_left, max(energy - drain, 0)):
+                continue
+            location = self.locations.get(index)
+            object = location.get_object() if location is not None else terrain.objects[index]
+            if object.is_beast() or (time_left != Time.DAWN and self.occupancy.flags[index] & Occupancy.HOSTILE):
+                continue
+
+            for direction in Direction.values:
+                x = terrain.xs[index] + direction.get_x_adjustment()
+                y = terrain.ys[index] + direction.get_y_adjustment()
+                if x < 0 or y < 0 or x >= self.WIDTH or y >= self.HEIGHT:
+                    continue
+                destination = y * self.WIDTH + x
+                location = self.locations.get(destination)
+                feature = location.get_feature() if location is not None else terrain.features[destination]
+                if feature == Feature.FROZEN_WASTE or self.occupancy.characters[destination] >= 29 or \
+                        self.occupancy.flags[destination] & Occupancy.HOSTILE:
+                    continue
+                step = 1 if farflame else grid[destination * len(Direction.values) + direction.ordinal]
+                if destination not in drains or drain + step < drains[destination]:
+                    drains[destination] = drain + step
+                    heapq.heappush(queue, (drain + step, destination))
+        return {self.get_location_at(index): max(time - drain, Time.NIGHT) for index, drain in drains.items()}
+
     @staticmethod
     def calc_distance(a: Location, b: Location) -> int:
         return abs(a.get_x() - b.get_x()) + abs(a.get_y() - b.get_y())
 
     @staticmethod
     def calc_direction(origin: Location, target: Location) -> Direction:
-        if origin.get_x() > target.get_x():
-            if origin.get_y() > target.get_y():
-                return Direction.NORTHWEST
-            if origin.get_y() < target.get_y():
-                return Direction.SOUTHWEST
-            return Direction.WEST
-
-        if origin.get_x() < target.get_x():
-            if origin.get_y() > target.get_y():
-                return Direction.NORTHEAST
-            if origin.get_y() < target.get_y():
-                return Direction.SOUTHEAST
-            return Direction.EAST
-        if origin.get_y() > target.get_y():
-            return Direction.NORTH
-        if origin.get_y() < target.get_y():
-            return Direction.SOUTH
-        assert False
-
-    def load(self):
-        raise NotImplementedError()
-
-    def save(self):
-        raise NotImplementedError()
+        direction = Direction.get_direction_by_sign(target.get_x() - origin.get_x(), target.get_y() - origin.get_y())
+        assert direction is not None
+        return direction
+
+    @staticmethod
+    def load(ix: BinaryIO, game: 'Midnight') -> 'Map':
+        map = Map(game)
+        game.map = map
+        count, = struct.unpack('<H', ix.read(2))
+        for _ in range(count):
+            Location.load(ix, map)
+        return map
+
+    def save(self, ox: BinaryIO) -> None:
+        # Only cells whose feature, object or special flag differ from the terrain are written.
+        # Sorted so that a save does not depend on the order in which cells happened to be materialized.
+        changed = sorted((location for location in self.locations.values() if location.is_changed()),
+                         key=Location.get_index)
+        ox.write(struct.pack('<H', len(changed)))
+        for location in changed:
+            location.save(ox)
 
     def get_route_node(self, index: int) -> Location:
-        return self.locations[routes[index][0]][routes[index][1]]
+        return self.get_location(routes[index][0], routes[index][1])
 
     def get_node_index(self, node: Location) -> int:
-        return self.routeNodes[node]
+        index = self.route_graph.get_node_index(node.get_x(), node.get_y())
+        if index == RouteGraph.UNREACHABLE:
+            raise KeyError(node)
+        return index
+
+    def get_occupancy(self) -> Occupancy:
+        return self.occupancy
+
+    def get_movement_costs(self) -> MovementCosts:
+        return self.movement_costs
+
+    def get_route_graph(self) -> RouteGraph:
+        return self.route_graph
 
     def get_next_node_a(self, location: Location) -> Location:
-        next_node = routes[self.get_node_index(location)][2]
-        return self.locations[routes[next_node][0]][routes[next_node][1]]
+        return self.get_route_node(self.route_graph.next_a[self.get_node_index(location)])
 
     def get_next_node_b(self, location: Location) -> Location:
-        next_node = routes[self.get_node_index(location)][3]
-        return self.locations[routes[next_node][0]][routes[next_node][1]]
+        return self.get_route_node(self.route_graph.next_b[self.get_node_index(location)])
+
+    def get_route_distance(self, a: Location, b: Location) -> int:
+        return self.route_graph.get_distance(self.get_node_index(a), self.get_node_index(b))
 
 
 class Midnight:
@@ -1132,22 +1984,60 @@ class Midnight:
     FAWKRIN: Character
     LORGRIM: Character
 
-    def __init__(self, random: Random = Random()):
+    MAGIC = b'JLOM'
+    DELTA_MAGIC = b'JLOD'
+    SAVE_VERSION = 4
+    HEADER = struct.Struct('<4sH')
+    STATE = struct.Struct('<IBBqH')
+    initial_records: Optional[tuple[list[bytes], ...]] = None
+    BATTLE = struct.Struct('<hBB')
+    RAW = 0
+    MASKED = 1
+    GAME_OVER = 0x01
+    MOON_RING_CONTROLLED = 0x02
+    ICE_CROWN_DESTROYED = 0x04
+    SEEDED = 0x08
+    # Room for every character to fight once in a day, each fight holding one generator state.
+    UNDO_BUDGET = 32 * 1024
+
+    def __init__(self, random: Random = Random(), seed: Optional[int] = None):
+        self.initialize_state(random, seed)
+        self.initialize_characters()
+        self.initialize_armies()
+        self.initialize_doomguard()
+        self.clear_changes()
+
+    def initialize_state(self, random: Random, seed: Optional[int]) -> None:
+        self.seed = seed
         self.status = None
+        # The running total follows every foul army; ice fear reads the copy taken as each night starts.
+        self.citadel_count = 0
         self.doom_darks_citadels = 0
+        self.ice_fear_version = 0
+        self.debug = False
+        self.registered_armies = set()
+        self.battle_cells = set()
+        self.cells_examined = 0
         self.ice_crown_destroyed = False
         self.armies = []
         self.characters = []
         self.game_over = False
         self.doomguard = []
         self.random_generator = random
+        self.random_source: RandomSource = ReproducibleRandomSource(random)
         self.map = Map(self)
         self.day = 0
         self.moon_ring_controlled = True
         self.battles = dict()
-        self.initialize_characters()
-        self.initialize_armies()
-        self.initialize_doomguard()
+        self.doomguard_engine = None
+        self.battle_resolver = None
+        self.loaded_battles = {}
+        self.doomguard_base = 0
+        self.changing = False
+        self.undo_stack: list[Change] = []
+        self.redo_stack: list[Change] = []
+        self.undo_size = 0
+        self.undo_budget = Midnight.UNDO_BUDGET
 
     def get_map(self) -> Map:
         return self.map
@@ -1155,6 +2045,99 @@ class Midnight:
     def set_map(self, map: Map) -> None:
         self.map = map
 
+    def fork(self) -> 'Midnight':
+        game = object.__new__(Midnight)
+        game.__dict__.update(self.__dict__)
+        fork = Fork(game)
+
+        map = object.__new__(Map)
+        map.__dict__.update(self.map.__dict__)
+        map.game = game
+        map.occupancy = self.map.occupancy.fork()
+        map.movement_costs = self.map.movement_costs.fork()
+        map.query_cache = {}
+        map.query_key = None
+        map.threat = None
+        map.threat_day = -1
+        map.route_nodes = None
+        map.locations = {index: fork.clone(location) for index, location in self.map.locations.items()}
+        map.TOWER_OF_DESPAIR = fork.get(self.map.TOWER_OF_DESPAIR)
+        map.XAJORKITH = fork.get(self.map.XAJORKITH)
+        map.USHGARAK = fork.get(self.map.USHGARAK)
+        map.LAKE_MIRROW = fork.get(self.map.LAKE_MIRROW)
+        game.map = map
+
+        units = []
+        battles = set(self.battles.values())
+        for character in self.characters:
+            units += [fork.clone(character), fork.clone(character.warriors), fork.clone(character.riders)]
+            if character.battle is not None:
+                battles.add(character.battle)
+        units += [fork.clone(army) for army in self.armies]
+        units += [fork.clone(army) for army in self.doomguard]
+        battles = [fork.clone(battle) for battle in battles]
+
+        for unit in units:
+            unit.game = game
+            unit.location = fork.get(unit.location)
+            if isinstance(unit, Character):
+                unit.warriors = fork.get(unit.warriors)
+                unit.riders = fork.get(unit.riders)
+                unit.battle = fork.get(unit.battle)
+                unit.time = Time(unit.time.get_time())
+            elif isinstance(unit, Doomguard):
+                unit.target = fork.get(unit.target)
+
+        for location in map.locations.values():
+            location.game = game
+            if location.characters is not None:
+                location.characters = {fork.get(character) for character in location.characters}
+            if location.armies is not None:
+                location.armies = {fork.get(army) for army in location.armies}
+            location.guard = fork.get(location.guard)
+
+        game.random_generator = copy.copy(self.random_generator)
+        if isinstance(self.random_source, ReproducibleRandomSource) and \
+                self.random_source.get_generator() is self.random_generator:
+            game.random_source = ReproducibleRandomSource(game.random_generator)
+        else:
+            game.random_source = self.random_source.fork()
+
+        for battle in battles:
+            battle.free = [fork.get(army) for army in battle.free]
+            battle.foul = [fork.get(army) for army in battle.foul]
+            battle.characters = {fork.get(character) for character in battle.characters}
+            battle.location = fork.get(battle.location)
+            if hasattr(battle, 'game'):
+                battle.game = game
+            battle.random_source = game.random_source if battle.random_source is self.random_source else \
+                battle.random_source.fork()
+
+        for name, value in self.__dict__.items():
+            if isinstance(value, Character):
+                setattr(game, name, fork.get(value))
+        game.characters = [fork.get(character) for character in self.characters]
+        game.armies = [fork.get(army) for army in self.armies]
+        game.doomguard = [fork.get(army) for army in self.doomguard]
+        game.registered_armies = {fork.get(army) for army in self.registered_armies}
+        game.battle_cells = set(self.battle_cells)
+        game.loaded_battles = {}
+        game.battles = {fork.get(location): fork.get(battle) for location, battle in self.battles.items()}
+        # Recorded changes point at this game's units, so a fork starts without history.
+        game.undo_stack = []
+        game.redo_stack = []
+        game.undo_size = 0
+        # Engines and resolvers hold on to the game they were built for.
+        game.doomguard_engine = None
+        game.battle_resolver = None
+        return game
+
+    def set_doomguard_engine(self, engine: Any) -> None:
+        self.doomguard_engine = engine
+
+    def set_battle_resolver(self, resolver: Any) -> None:
+        self.battle_resolver = resolver
+
     def remove_doomguard(self, army: Doomguard) -> None:
         self.doomguard.remove(army)
 
@@ -1173,8 +2156,57 @@ class Midnight:
         self.check_special_conditions()
         if not self.game_over:
             self.day += 1
+            if self.debug:
+                self.check_doom_darks_citadels()
             self.calc_doom_darks_citadels()
             self.calc_night_activity()
+        self.clear_changes()
+
+    def push_change(self, change: Change) -> None:
+        self.undo_stack.append(change)
+        self.undo_size += change.get_size()
+        self.redo_stack.clear()
+        self.trim_changes()
+
+    def trim_changes(self) -> None:
+        while self.undo_size > self.undo_budget and self.undo_stack:
+            self.undo_size -= self.undo_stack.pop(0).get_size()
+
+    def can_undo(self) -> bool:
+        return len(self.undo_stack) > 0
+
+    def can_redo(self) -> bool:
+        return len(self.redo_stack) > 0
+
+    def undo(self) -> bool:
+        if not self.undo_stack:
+            return False
+        change = self.undo_stack.pop()
+        self.undo_size -= change.get_size()
+        change.undo()
+        self.redo_stack.append(change)
+        return True
+
+    def redo(self) -> bool:
+        if not self.redo_stack:
+            return False
+        change = self.redo_stack.pop()
+        change.redo()
+        self.undo_stack.append(change)
+        self.undo_size += change.get_size()
+        return True
+
+    def clear_changes(self) -> None:
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.undo_size = 0
+
+    def get_undo_budget(self) -> int:
+        return self.undo_budget
+
+    def set_undo_budget(self, budget: int) -> None:
+        self.undo_budget = budget
+        self.trim_changes()
 
     def dawn(self) -> None:
         for character in self.characters:
@@ -1200,11 +2232,40 @@ class Midnight:
 
         self.check_game_over()
 
-    def calc_doom_darks_citadels(self):
-        self.doom_darks_citadels = 0
+    def count_doom_darks_citadels(self) -> int:
+        count = 0
         for army in self.armies:
             if army.get_race() == Race.FOUL:
-                self.doom_darks_citadels += 5 if army.get_location().get_feature() == Feature.CITADEL else 2
+                count += 5 if army.get_location().get_feature() == Feature.CITADEL else 2
+        return count
+
+    def calc_doom_darks_citadels(self):
+        if self.doom_darks_citadels != self.citadel_count:
+            self.doom_darks_citadels = self.citadel_count
+            self.ice_fear_version += 1
+
+    def check_doom_darks_citadels(self) -> None:
+        count = self.count_doom_darks_citadels()
+        assert self.citadel_count == count, f"Doom Dark's citadels: {self.citadel_count} != {count}"
+
+    def add_army(self, army: Army) -> None:
+        self.armies.append(army)
+        self.registered_armies.add(army)
+        self.update_doom_darks_citadels(army, 0)
+
+    def remove_army(self, army: Army) -> None:
+        weight = army.get_citadel_weight()
+        self.armies.remove(army)
+        self.registered_armies.discard(army)
+        self.citadel_count -= weight
+
+    def update_doom_darks_citadels(self, army: Army, previous_weight: int) -> None:
+        if army not in self.registered_armies:
+            return
+        self.citadel_count += army.get_citadel_weight() - previous_weight
+
+    def set_debug(self, debug: bool) -> None:
+        self.debug = debug
 
     def calc_night_activity(self):
         self.battles.clear()
@@ -1223,26 +2284,72 @@ class Midnight:
             if army.get_race() != Race.FOUL:
                 army.get_location().set_special(True)
 
-        for doomguard in self.doomguard:
-            while doomguard.get_move_count() < Doomguard.MAX_MOVE_COUNT:
-                doomguard.execute_move()
-            doomguard.reset_move_count()
+        if self.doomguard_engine is not None:
+            self.doomguard_engine.run()
+        else:
+            for doomguard in self.doomguard:
+                while doomguard.get_move_count() < Doomguard.MAX_MOVE_COUNT:
+                    doomguard.execute_move()
+                doomguard.reset_move_count()
 
         for character in self.characters:
-            location = character.get_location()
-            location.set_special(False)
-            if (len(location.get_armies()) > 0 or (
-                    location.get_guard() is not None and location.get_guard().get_race() == Race.FOUL)) and location not in self.battles:
-                self.battles[location] = Battle(location)
-
+            character.get_location().set_special(False)
         for army in self.armies:
             if army.get_race() != Race.FOUL:
                 army.get_location().set_special(False)
-                if len(army.get_location().get_armies()) > 0 and army.get_location() not in self.battles:
-                    self.battles[army.get_location()] = Battle(army.get_location())
 
-        for battle in self.battles.values():
-            battle.run()
+        locations = self.find_battle_locations()
+        if self.debug:
+            expected = self.scan_battle_locations()
+            assert locations == expected, f"Battles: {locations} != {expected}"
+        for location in locations:
+            self.battles[location] = Battle(location)
+
+        if self.battle_resolver is not None:
+            self.battle_resolver.run(list(self.battles.values()))
+        else:
+            for battle in self.battles.values():
+                battle.run()
+
+    def find_battle_locations(self) -> list[Location]:
+        occupancy = self.map.get_occupancy()
+        cells = occupancy.take_touched() | self.battle_cells
+        self.cells_examined = len(cells)
+        found = []
+        for index in cells:
+            location = self.map.get_location_at(index)
+            order = self.get_battle_order(location)
+            if order is not None:
+                found.append((order, location))
+        found.sort(key=lambda item: item[0])
+        self.battle_cells = {location.get_index() for _, location in found}
+        return [location for _, location in found]
+
+    def get_battle_order(self, location: Location) -> Optional[tuple[int, int]]:
+        occupancy = self.map.get_occupancy()
+        if occupancy.get_character_count(location) > 0 and occupancy.is_hostile(location):
+            return 0, min(self.characters.index(character) for character in location.get_characters())
+        guard = location.get_guard()
+        if guard is not None and guard.get_race() != Race.FOUL and guard in self.registered_armies and \
+                occupancy.get_army_count(location) > 0:
+            return 1, self.armies.index(guard)
+        return None
+
+    def scan_battle_locations(self) -> list[Location]:
+        occupancy = self.map.get_occupancy()
+        locations = []
+        for character in self.characters:
+            location = character.get_location()
+            if occupancy.is_hostile(location) and location not in locations:
+                locations.append(location)
+        for army in self.armies:
+            location = army.get_location()
+            if army.get_race() != Race.FOUL and occupancy.get_army_count(location) > 0 and location not in locations:
+                locations.append(location)
+        return locations
+
+    def get_cells_examined(self) -> int:
+        return self.cells_examined
 
     def check_game_over(self) -> None:
         if not self.MORKIN.is_alive():
@@ -1280,11 +2387,166 @@ class Midnight:
     def get_status(self) -> Status:
         return self.status
 
-    def load(self):
-        raise NotImplementedError()
+    @staticmethod
+    def load(ix: BinaryIO) -> 'Midnight':
+        magic, version = Midnight.HEADER.unpack(ix.read(Midnight.HEADER.size))
+        if magic != Midnight.MAGIC or version != Midnight.SAVE_VERSION:
+            raise ValueError(f"Not a version {Midnight.SAVE_VERSION} save")
+        day, status, flags, seed, citadels = Midnight.STATE.unpack(ix.read(Midnight.STATE.size))
+
+        game = Midnight.__new__(Midnight)
+        game.initialize_state(Random(), seed if flags & Midnight.SEEDED else None)
+        game.day = day
+        game.doom_darks_citadels = citadels
+        game.status = Status.values[status] if status != NONE else None
+        game.game_over = (flags & Midnight.GAME_OVER) != 0
+        game.moon_ring_controlled = (flags & Midnight.MOON_RING_CONTROLLED) != 0
+        game.ice_crown_destroyed = (flags & Midnight.ICE_CROWN_DESTROYED) != 0
+        game.random_source = RandomSource.load(ix)
+        if isinstance(game.random_source, ReproducibleRandomSource):
+            game.random_generator = game.random_source.get_generator()
+        Map.load(ix, game)
+
+        count, = struct.unpack('<H', ix.read(2))
+        for _ in range(count):
+            location, winner, current = Midnight.BATTLE.unpack(ix.read(Midnight.BATTLE.size))
+            battle = game.get_loaded_battle(game.map.get_location_at(location))
+            battle.winner = Race.values[winner] if winner != NONE else None
+            if current:
+                game.battles[battle.get_location()] = battle
+        game.battle_cells = {location.get_index() for location in game.battles}
+
+        count, = struct.unpack('<H', ix.read(2))
+        for _ in range(count):
+            character = Character.load(ix, game)
+            game.characters.append(character)
+            setattr(game, character.get_name().upper(), character)
+
+        count, = struct.unpack('<H', ix.read(2))
+        for _ in range(count):
+            army = Army.load(ix, game)
+            army.guard(army.get_location())
+            game.add_army(army)
+
+        count, = struct.unpack('<H', ix.read(2))
+        game.doomguard_base = Doomguard.next_id
+        for _ in range(count):
+            game.doomguard.append(Doomguard.load(ix, game))
+        game.loaded_battles = {}
+        return game
+
+    def get_loaded_battle(self, location: Location) -> Battle:
+        battle = self.loaded_battles.get(location)
+        if battle is None:
+            battle = Battle(location)
+            self.loaded_battles[location] = battle
+        return battle
+
+    def save(self, ox: BinaryIO) -> None:
+        ox.write(self.HEADER.pack(self.MAGIC, self.SAVE_VERSION))
+        self.save_state(ox)
+        for units in [self.characters, self.armies, self.doomguard]:
+            ox.write(struct.pack('<H', len(units)))
+            for unit in units:
+                unit.save(ox)
+
+    def save_state(self, ox: BinaryIO) -> None:
+        flags = (self.GAME_OVER if self.game_over else 0) | (
+            self.MOON_RING_CONTROLLED if self.moon_ring_controlled else 0) | (
+                    self.ICE_CROWN_DESTROYED if self.ice_crown_destroyed else 0) | (
+                    self.SEEDED if self.seed is not None else 0)
+        ox.write(self.STATE.pack(self.day, self.status.ordinal if self.status is not None else NONE, flags,
+                                 self.seed or 0, self.doom_darks_citadels))
+        self.random_source.save(ox)
+        self.map.save(ox)
+
+        battles = dict(self.battles)
+        for character in self.characters:
+            if character.get_battle() is not None:
+                battles.setdefault(character.get_battle().get_location(), character.get_battle())
+        ox.write(struct.pack('<H', len(battles)))
+        for location, battle in battles.items():
+            winner = battle.get_winner()
+            ox.write(self.BATTLE.pack(location.get_index(), winner.ordinal if winner is not None else NONE,
+                                      location in self.battles))
+
+    def get_records(self) -> tuple[dict[int, bytes], ...]:
+        tables = []
+        for units in [self.characters, self.armies]:
+            tables.append({index: self.get_record(unit) for index, unit in enumerate(units)})
+        tables.append({army.id - self.doomguard_base: self.get_record(army) for army in self.doomguard})
+        return tuple(tables)
+
+    @staticmethod
+    def get_record(unit: Unit) -> bytes:
+        ox = io.BytesIO()
+        unit.save(ox)
+        return ox.getvalue()
+
+    @staticmethod
+    def get_initial_records() -> tuple[dict[int, bytes], ...]:
+        if Midnight.initial_records is None:
+            Midnight.initial_records = Midnight(Random(0)).get_records()
+        return Midnight.initial_records
+
+    def save_delta(self, ox: BinaryIO) -> None:
+        # Units are written only where their record differs from the starting scenario.
+        state = io.BytesIO()
+        self.save_state(state)
+        ox.write(self.HEADER.pack(self.DELTA_MAGIC, self.SAVE_VERSION))
+        ox.write(struct.pack('<I', len(state.getvalue())) + state.getvalue())
+        for initial, current in zip(self.get_initial_records(), self.get_records()):
+            removed = [key for key in initial if key not in current]
+            changed = [(key, record) for key, record in current.items() if initial.get(key) != record]
+            ox.write(struct.pack(f'<H{len(removed)}H', len(removed), *removed))
+            ox.write(struct.pack('<H', len(changed)))
+            for key, record in changed:
+                ox.write(struct.pack('<H', key) + self.diff_record(initial.get(key), record))
+
+    @staticmethod
+    def diff_record(initial: Optional[bytes], record: bytes) -> bytes:
+        if initial is None or len(initial) != len(record):
+            return struct.pack('<BH', Midnight.RAW, len(record)) + record
+        # A bit per byte marks what changed; only those bytes follow the mask.
+        mask = bytearray((len(record) + 7) // 8)
+        changed = bytearray()
+        for i, (old, new) in enumerate(zip(initial, record)):
+            if old != new:
+                mask[i // 8] |= 1 << (i % 8)
+                changed.append(new)
+        return struct.pack('<BH', Midnight.MASKED, len(changed)) + mask + changed
 
-    def save(self):
-        raise NotImplementedError()
+    @staticmethod
+    def patch_record(ix: BinaryIO, initial: Optional[bytes]) -> bytes:
+        mode, size = struct.unpack('<BH', ix.read(3))
+        if mode == Midnight.RAW:
+            return ix.read(size)
+        mask = ix.read((len(initial) + 7) // 8)
+        changed = iter(ix.read(size))
+        return bytes(next(changed) if mask[i // 8] & (1 << (i % 8)) else old for i, old in enumerate(initial))
+
+    @staticmethod
+    def load_delta(ix: BinaryIO) -> 'Midnight':
+        magic, version = Midnight.HEADER.unpack(ix.read(Midnight.HEADER.size))
+        if magic != Midnight.DELTA_MAGIC or version != Midnight.SAVE_VERSION:
+            raise ValueError(f"Not a version {Midnight.SAVE_VERSION} delta save")
+        length, = struct.unpack('<I', ix.read(4))
+        ox = io.BytesIO()
+        ox.write(Midnight.HEADER.pack(Midnight.MAGIC, Midnight.SAVE_VERSION))
+        ox.write(ix.read(length))
+        for initial in Midnight.get_initial_records():
+            count, = struct.unpack('<H', ix.read(2))
+            removed = set(struct.unpack(f'<{count}H', ix.read(2 * count)))
+            records = {key: record for key, record in initial.items() if key not in removed}
+            count, = struct.unpack('<H', ix.read(2))
+            for _ in range(count):
+                key, = struct.unpack('<H', ix.read(2))
+                records[key] = Midnight.patch_record(ix, initial.get(key))
+            ox.write(struct.pack('<H', len(records)))
+            for key in sorted(records):
+                ox.write(records[key])
+        ox.seek(0)
+        return Midnight.load(ox)
 
     def initialize_characters(self) -> None:
         self.LUXOR = Character(self, 0, "Luxor", "Luxor the Moonprince", Race.FREE, 12, 40, 180, 127, 25, 80, 0x17,
@@ -1454,413 +2716,414 @@ class Midnight:
     def initialize_armies(self):
         army = Army(self, Race.FREE, 600, Type.WARRIORS)
         army.guard(8, 0) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 200, Type.RIDERS)
         army.guard(46, 3) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 400, Type.WARRIORS)
         army.guard(28, 4) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 1000, Type.WARRIORS)
         army.guard(22, 5) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 300, Type.RIDERS)
         army.guard(32, 6) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 500, Type.WARRIORS)
         army.guard(23, 7) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 1200, Type.RIDERS)
         army.guard(29, 7) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 1100, Type.WARRIORS)
         army.guard(37, 7) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 400, Type.RIDERS)
         army.guard(40, 8) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 300, Type.WARRIORS)
         army.guard(57, 8) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 500, Type.WARRIORS)
         army.guard(39, 9) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FEY, 200, Type.WARRIORS)
         army.guard(11, 10) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 300, Type.WARRIORS)
         army.guard(21, 11) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 250, Type.WARRIORS)
         army.guard(25, 11) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 1000, Type.RIDERS)
         army.guard(29, 12) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 300, Type.RIDERS)
         army.guard(36, 12) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 200, Type.RIDERS)
         army.guard(51, 12) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 150, Type.WARRIORS)
         army.guard(62, 12) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 200, Type.WARRIORS)
         army.guard(16, 13) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 300, Type.WARRIORS)
         army.guard(55, 13) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 700, Type.WARRIORS)
         army.guard(57, 15) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 250, Type.WARRIORS)
         army.guard(14, 16) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 500, Type.WARRIORS)
         army.guard(27, 16) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 200, Type.WARRIORS)
         army.guard(34, 16) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FEY, 550, Type.WARRIORS)
         army.guard(42, 16) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 150, Type.RIDERS)
         army.guard(52, 16) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 250, Type.WARRIORS)
         army.guard(19, 17) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 150, Type.WARRIORS)
         army.guard(22, 18) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 250, Type.WARRIORS)
         army.guard(54, 18) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 100, Type.WARRIORS)
         army.guard(14, 20) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 300, Type.WARRIORS)
         army.guard(49, 20) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FEY, 150, Type.WARRIORS)
         army.guard(57, 20) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 900, Type.WARRIORS)
         army.guard(18, 21) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 100, Type.WARRIORS)
         army.guard(42, 21) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 350, Type.WARRIORS)
         army.guard(31, 22) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 400, Type.RIDERS)
         army.guard(46, 22) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 250, Type.WARRIORS)
         army.guard(39, 23) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 200, Type.WARRIORS)
         army.guard(56, 24) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 200, Type.WARRIORS)
         army.guard(32, 25) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 300, Type.WARRIORS)
         army.guard(45, 26) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 150, Type.RIDERS)
         army.guard(54, 26) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 200, Type.RIDERS)
         army.guard(34, 27) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 250, Type.WARRIORS)
         army.guard(17, 28) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 250, Type.WARRIORS)
         army.guard(42, 28) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 1000, Type.WARRIORS)
         army.guard(24, 29) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 150, Type.WARRIORS)
         army.guard(30, 29) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 150, Type.RIDERS)
         army.guard(51, 29) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 600, Type.RIDERS)
         army.guard(57, 29) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.TARG, 200, Type.RIDERS)
         army.guard(55, 31) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 300, Type.WARRIORS)
         army.guard(21, 32) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FOUL, 300, Type.WARRIORS)
         army.guard(23, 32) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 700, Type.WARRIORS)
         army.guard(43, 32) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 250, Type.WARRIORS)
         army.guard(13, 33) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 150, Type.WARRIORS)
         army.guard(34, 33) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 100, Type.RIDERS)
         army.guard(30, 34) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.TARG, 350, Type.RIDERS)
         army.guard(59, 34) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 400, Type.WARRIORS)
         army.guard(21, 36) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 150, Type.WARRIORS)
         army.guard(54, 38) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 200, Type.WARRIORS)
         army.guard(27, 39) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 200, Type.WARRIORS)
         army.guard(22, 40) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 200, Type.WARRIORS)
         army.guard(25, 40) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 100, Type.WARRIORS)
         army.guard(48, 40) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 150, Type.RIDERS)
         army.guard(42, 41) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FEY, 100, Type.RIDERS)
         army.guard(55, 41) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 250, Type.RIDERS)
         army.guard(17, 42) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 750, Type.WARRIORS)
         army.guard(28, 42) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 100, Type.RIDERS)
         army.guard(37, 43) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FEY, 500, Type.WARRIORS)
         army.guard(59, 43) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 550, Type.WARRIORS)
         army.guard(44, 45) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 150, Type.WARRIORS)
         army.guard(29, 46) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 100, Type.RIDERS)
         army.guard(42, 46) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 150, Type.WARRIORS)
         army.guard(7, 47) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 250, Type.WARRIORS)
         army.guard(10, 47) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 200, Type.WARRIORS)
         army.guard(48, 48) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 150, Type.RIDERS)
         army.guard(21, 49) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 250, Type.RIDERS)
         army.guard(45, 49) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 150, Type.WARRIORS)
         army.guard(54, 50) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 200, Type.WARRIORS)
         army.guard(39, 51) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 150, Type.WARRIORS)
         army.guard(42, 51) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 150, Type.WARRIORS)
         army.guard(50, 51) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 200, Type.WARRIORS)
         army.guard(46, 52) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 250, Type.WARRIORS)
         army.guard(12, 54) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 250, Type.WARRIORS)
         army.guard(25, 54) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 200, Type.WARRIORS)
         army.guard(44, 54) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 150, Type.WARRIORS)
         army.guard(55, 54) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 100, Type.RIDERS)
         army.guard(7, 55) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 600, Type.RIDERS)
         army.guard(10, 55) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 250, Type.WARRIORS)
         army.guard(17, 56) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 150, Type.WARRIORS)
         army.guard(21, 56) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 150, Type.WARRIORS)
         army.guard(37, 56) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 150, Type.WARRIORS)
         army.guard(8, 57) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 200, Type.WARRIORS)
         army.guard(12, 57) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 200, Type.WARRIORS)
         army.guard(39, 58) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 250, Type.WARRIORS)
         army.guard(56, 58) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 150, Type.RIDERS)
         army.guard(63, 58) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 300, Type.WARRIORS)
         army.guard(42, 59) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 750, Type.RIDERS)
         army.guard(45, 59) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 50, Type.RIDERS)
         army.guard(4, 60) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FEY, 300, Type.RIDERS)
         army.guard(33, 60) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 250, Type.RIDERS)
         army.guard(23, 60) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 250, Type.WARRIORS)
         army.guard(59, 60) 
-        self.armies.append(army)
+        self.add_army(army)
         
         army = Army(self, Race.FREE, 200, Type.WARRIORS)
         army.guard(14, 60) 
-        self.armies.append(army)
+        self.add_army(army)
 
     def initialize_doomguard(self):
+        self.doomguard_base = Doomguard.next_id
         army = Doomguard(self, 0, 1000, Type.RIDERS, Orders.FOLLOW, self.LUXOR)
         army.set_location(29, 7)
         self.doomguard.append(army)
@@ -2375,4 +3638,19 @@ class Midnight:
 
 
     def random(self, n: int) -> int:
-        return self.random_generator.randint(0,n)
+        return self.random_source.random(n)
+
+    def get_random_source(self) -> RandomSource:
+        return self.random_source
+
+    def get_seed(self) -> Optional[int]:
+        return self.seed
+
+    def get_battle_random_source(self, location: Location) -> RandomSource:
+        if self.seed is None:
+            return self.random_source
+        # A string seed hashes the same way in every process, so each battle's stream is independent of the others.
+        return ReproducibleRandomSource(Random(f"{self.seed}:{self.day}:{location.get_x()}:{location.get_y()}"))
+
+    def set_random_source(self, random_source: RandomSource) -> None:
+        self.random_source = random_source
@@ -0,0 +1,186 @@
+import io
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from typing import BinaryIO, Callable, Optional
+
+from game import Midnight
+
+
+class Journal:
+    SNAPSHOT = "snapshot.bin"
+    JOURNAL = "journal.bin"
+    RECORD = struct.Struct('<IIIB')
+    GENERATION = struct.Struct('<I')
+    COMMAND = 1
+    STATE = 2
+    FLUSH_DELAY = 0.05
+    COMPACT_EVERY = 64
+
+    def __init__(self, directory: str, flush_delay: float = FLUSH_DELAY, compact_every: int = COMPACT_EVERY) -> None:
+        self.directory = directory
+        self.flush_delay = flush_delay
+        self.compact_every = compact_every
+        self.states = 0
+        self.error: Optional[BaseException] = None
+        self.generation = self.read_generation(self.get_path(self.SNAPSHOT))
+        self.queue: queue.Queue = queue.Queue()
+        os.makedirs(directory, exist_ok=True)
+        self.journal = self.open_journal(self.get_path(self.JOURNAL))
+        self.writer = threading.Thread(target=self.run, name="journal", daemon=True)
+        self.writer.start()
+
+    def get_path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @staticmethod
+    def open_journal(path: str) -> BinaryIO:
+        # Cut off any torn tail left by a crash; records appended after it would never be read back.
+        journal = open(path, 'ab')
+        end = Journal.scan_records(path)[1]
+        if journal.tell() != end:
+            journal.truncate(end)
+            journal.flush()
+            os.fsync(journal.fileno())
+        return journal
+
+    def record_command(self, command: bytes) -> None:
+        self.queue.put((self.COMMAND, command))
+
+    def record_state(self, game: Midnight) -> None:
+        # Serializing happens here, on the caller's thread, so the writer never sees a game mid-update.
+        self.states += 1
+        if self.states >= self.compact_every:
+            self.compact(game)
+            return
+        ox = io.BytesIO()
+        game.save_delta(ox)
+        self.queue.put((self.STATE, ox.getvalue()))
+
+    def compact(self, game: Midnight) -> None:
+        self.states = 0
+        ox = io.BytesIO()
+        game.save(ox)
+        self.queue.put((None, ox.getvalue()))
+
+    def flush(self) -> None:
+        self.queue.join()
+        if self.error is not None:
+            raise self.error
+
+    def close(self) -> None:
+        self.flush()
+        self.queue.put(None)
+        self.writer.join()
+        self.journal.close()
+
+    def run(self) -> None:
+        while True:
+            batch = [self.queue.get()]
+            if batch[0] is not None and self.flush_delay > 0:
+                # Wait a moment so that actions arriving together share one fsync.
+                time.sleep(self.flush_delay)
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.write(batch)
+            except BaseException as error:
+                self.error = error
+            for _ in batch:
+                self.queue.task_done()
+            if None in batch:
+                return
+
+    def write(self, batch: list) -> None:
+        pending = False
+        for entry in batch:
+            if entry is None:
+                break
+            kind, payload = entry
+            if kind is None:
+                self.sync(pending)
+                pending = False
+                self.write_snapshot(payload)
+            else:
+                self.journal.write(self.pack(kind, payload, self.generation))
+                pending = True
+        self.sync(pending)
+
+    def sync(self, pending: bool) -> None:
+        if pending:
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+
+    def write_snapshot(self, payload: bytes) -> None:
+        # Records carry the generation of the snapshot they follow, so if we stop between replacing the snapshot and
+        # truncating the journal, recovery skips the stale records instead of rolling the game back.
+        generation = self.generation + 1
+        path = self.get_path(self.SNAPSHOT)
+        with open(path + ".tmp", 'wb') as ox:
+            ox.write(self.GENERATION.pack(generation))
+            ox.write(payload)
+            ox.flush()
+            os.fsync(ox.fileno())
+        os.replace(path + ".tmp", path)
+        self.generation = generation
+        # Everything journaled so far is covered by the snapshot.
+        self.journal.close()
+        self.journal = open(self.get_path(self.JOURNAL), 'wb')
+
+    @staticmethod
+    def pack(kind: int, payload: bytes, generation: int = 0) -> bytes:
+        body = Journal.GENERATION.pack(generation) + bytes([kind]) + payload
+        return Journal.RECORD.pack(len(payload), zlib.crc32(body), generation, kind) + payload
+
+    @staticmethod
+    def read_generation(path: str) -> int:
+        if not os.path.exists(path):
+            return 0
+        with open(path, 'rb') as ix:
+            return Journal.GENERATION.unpack(ix.read(Journal.GENERATION.size))[0]
+
+    @staticmethod
+    def scan_records(path: str) -> tuple[list[tuple[int, int, bytes]], int]:
+        # Returns the valid (generation, kind, payload) records and the offset just past the last of them.
+        records = []
+        if not os.path.exists(path):
+            return records, 0
+        with open(path, 'rb') as ix:
+            data = ix.read()
+        position = 0
+        while position + Journal.RECORD.size <= len(data):
+            length, crc, stamp, kind = Journal.RECORD.unpack_from(data, position)
+            payload = data[position + Journal.RECORD.size:position + Journal.RECORD.size + length]
+            # A short or corrupt record is the torn tail of a crash; nothing after it can be trusted.
+            if len(payload) < length or zlib.crc32(Journal.GENERATION.pack(stamp) + bytes([kind]) + payload) != crc:
+                break
+            records.append((stamp, kind, payload))
+            position += Journal.RECORD.size + length
+        return records, position
+
+    @staticmethod
+    def read_records(path: str, generation: Optional[int] = None) -> list[tuple[int, bytes]]:
+        return [(kind, payload) for stamp, kind, payload in Journal.scan_records(path)[0]
+                if generation is None or stamp == generation]
+
+    @staticmethod
+    def recover(directory: str, apply: Optional[Callable[[Midnight, bytes], None]] = None) -> Optional[Midnight]:
+        game = None
+        snapshot = os.path.join(directory, Journal.SNAPSHOT)
+        generation = Journal.read_generation(snapshot)
+        if os.path.exists(snapshot):
+            with open(snapshot, 'rb') as ix:
+                ix.seek(Journal.GENERATION.size)
+                game = Midnight.load(ix)
+        for kind, payload in Journal.read_records(os.path.join(directory, Journal.JOURNAL), generation):
+            if kind == Journal.STATE:
+                game = Midnight.load_delta(io.BytesIO(payload))
+            elif kind == Journal.COMMAND and game is not None and apply is not None:
+                apply(game, payload)
+        return game
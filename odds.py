@@ -0,0 +1,191 @@
+from functools import lru_cache
+from typing import Any, Optional
+
+from enums import Race
+from game import Battle, Character, Location
+
+# A character strikes as (strength, energy); an army as (how_many, success_chance).
+Strikers = tuple[tuple[int, int], ...]
+
+
+class BattleOdds:
+    __slots__ = ('win', 'draw', 'loss', 'free_casualties', 'foul_casualties')
+
+    def __init__(self, win: float, draw: float, loss: float, free_casualties: float, foul_casualties: float) -> None:
+        self.win = win
+        self.draw = draw
+        self.loss = loss
+        self.free_casualties = free_casualties
+        self.foul_casualties = foul_casualties
+
+    def get_win(self) -> float:
+        return self.win
+
+    def get_draw(self) -> float:
+        return self.draw
+
+    def get_loss(self) -> float:
+        return self.loss
+
+    def get_free_casualties(self) -> float:
+        return self.free_casualties
+
+    def get_foul_casualties(self) -> float:
+        return self.foul_casualties
+
+    def __str__(self):
+        return f"win {self.win:.0%}, draw {self.draw:.0%}, loss {self.loss:.0%}"
+
+
+def get_battle_inputs(location: Location, attacker: Optional[Character] = None) -> tuple[Strikers, Strikers, Strikers]:
+    characters = []
+    free = []
+    foul = []
+
+    guard = location.get_guard()
+    if guard is not None and guard.get_how_many() > 0:
+        if guard.get_race() == Race.FOUL:
+            foul.append((guard.get_how_many(), Battle.calc_foul_chance(location, guard)))
+        else:
+            free.append((guard.get_how_many(), Battle.calc_guard_chance(guard)))
+
+    present = [character for character in location.get_characters() if character is not attacker]
+    for character in present + ([attacker] if attacker is not None else []):
+        if character.is_alive() and not character.is_hidden():
+            characters.append((character.get_strength(), character.get_energy()))
+            for army in [character.get_riders(), character.get_warriors()]:
+                if army.get_how_many() > 0:
+                    free.append((army.get_how_many(), Battle.calc_free_chance(location, army, character)))
+
+    for army in location.get_armies():
+        foul.append((army.get_how_many(), Battle.calc_foul_chance(location, army)))
+
+    return tuple(sorted(characters)), tuple(sorted(free)), tuple(sorted(foul))
+
+
+def estimate_battle(location: Location) -> BattleOdds:
+    return estimate(*get_battle_inputs(location))
+
+
+def estimate_attack(character: Character) -> BattleOdds:
+    destination = character.get_game().get_map().get_in_front(character.get_location(), character.get_direction())
+    return estimate(*get_battle_inputs(destination, character))
+
+
+def get_hit_chance(success_chance: int) -> float:
+    # Midnight.random(256) is inclusive, giving 257 equally likely rolls.
+    return min(max(success_chance, 0), 257) / 257
+
+
+def get_parry_chance(success_chance: int) -> float:
+    # A blow lands when the second roll beats the enemy's success chance.
+    return min(max(256 - success_chance, 0), 257) / 257
+
+
+def get_capacity(how_many: int) -> int:
+    # Every landed blow costs five men, and an army leaves the list once it has none left.
+    return max(-(-how_many // 5), 1)
+
+
+def get_mortal(attackers: Strikers, defenders: Strikers) -> list[bool]:
+    # A defender that cannot be wiped out within every attempt available never changes the state.
+    bound = sum(min(len(defenders), hits + 1) for hits, _ in attackers)
+    return [get_capacity(how_many) <= bound for how_many, _ in defenders]
+
+
+def get_groups(defenders: Strikers) -> list[tuple[int, int]]:
+    # The roster is sorted, so identical armies sit next to each other and can share states.
+    groups = []
+    start = 0
+    for i in range(1, len(defenders) + 1):
+        if i == len(defenders) or defenders[i] != defenders[start]:
+            if i - start > 1:
+                groups.append((start, i))
+            start = i
+    return groups
+
+
+@lru_cache(maxsize=1024)
+def skirmish(attackers: Strikers, defenders: Strikers) -> tuple[dict[tuple[int, ...], float], tuple[float, ...]]:
+    # Follows Battle.skirmish attacker by attacker. A state counts the blows each defender has taken; it returns the
+    # distribution of final states and the expected blows landed on each defender.
+    capacities = [get_capacity(how_many) for how_many, _ in defenders]
+    parries = [get_parry_chance(chance) for _, chance in defenders]
+    groups = get_groups(defenders)
+    mortal = get_mortal(attackers, defenders)
+    blows = [0.0] * len(defenders)
+
+    def add(states: dict, key: Any, p: float) -> None:
+        states[key] = states.get(key, 0.0) + p
+
+    def struck(state: tuple[int, ...], i: int) -> tuple[int, ...]:
+        taken = list(state)
+        taken[i] += 1
+        for start, end in groups:
+            taken[start:end] = sorted(taken[start:end])
+        return tuple(taken)
+
+    states = {(0,) * len(defenders): 1.0}
+    for hits, chance in attackers:
+        swing = get_hit_chance(chance)
+        pending: dict[tuple[tuple[int, ...], int], float] = {}
+        for state, p in states.items():
+            listed = sum(1 for taken, capacity in zip(state, capacities) if taken < capacity)
+            add(pending, (state, min(listed, hits + 1)), p)
+        states = {}
+        while pending:
+            attempts: dict[tuple[tuple[int, ...], int], float] = {}
+            for (state, remaining), p in pending.items():
+                listed = [i for i, (taken, capacity) in enumerate(zip(state, capacities)) if taken < capacity]
+                if remaining == 0 or len(listed) == 0:
+                    add(states, state, p)
+                    continue
+                stay = p * (1 - swing)
+                share = p * swing / len(listed)
+                for i in listed:
+                    landed = share * parries[i]
+                    blows[i] += landed
+                    if mortal[i]:
+                        add(attempts, (struck(state, i), remaining - 1), landed)
+                        stay += share - landed
+                    else:
+                        stay += share
+                add(attempts, (state, remaining - 1), stay)
+            pending = attempts
+    return states, tuple(blows)
+
+
+def is_wiped_out(state: tuple[int, ...], defenders: Strikers) -> bool:
+    return all(taken >= get_capacity(how_many) for taken, (how_many, _) in zip(state, defenders))
+
+
+@lru_cache(maxsize=1024)
+def estimate(characters: Strikers, free: Strikers, foul: Strikers) -> BattleOdds:
+    if len(foul) == 0:
+        return BattleOdds(1.0, 0.0, 0.0, 0.0, 0.0)
+
+    attackers = tuple((strength, energy + 0x80) for strength, energy in characters)
+    attackers += tuple((how_many // 5, chance) for how_many, chance in free)
+    states, blows = skirmish(attackers, foul)
+    win = sum((p for state, p in states.items() if is_wiped_out(state, foul)), 0.0)
+    foul_casualties = 5 * sum(blows)
+    if len(free) == 0:
+        return BattleOdds(win, 0.0, 1.0 - win, 0.0, foul_casualties)
+
+    # Surviving foul armies strike back in roster order with what they have left. Armies too large to fall carry no
+    # state, so they strike with the numbers expected to survive.
+    mortal = get_mortal(attackers, foul)
+    loss = 0.0
+    free_casualties = 0.0
+    for state, p in states.items():
+        survivors = []
+        for i, (taken, (how_many, chance)) in enumerate(zip(state, foul)):
+            if taken < get_capacity(how_many):
+                left = how_many - 5 * (taken if mortal[i] else blows[i])
+                survivors.append((max(int(left), 0) // 5, chance))
+        if len(survivors) == 0:
+            continue
+        counter_states, counter_blows = skirmish(tuple(survivors), free)
+        loss += p * sum(q for state, q in counter_states.items() if is_wiped_out(state, free))
+        free_casualties += p * 5 * sum(counter_blows)
+    return BattleOdds(win, 1.0 - win - loss, loss, free_casualties, foul_casualties)
@@ -0,0 +1,152 @@
+import bisect
+import struct
+from random import Random
+from typing import Optional, BinaryIO
+
+from enums import Direction
+from game import Midnight
+
+
+class Command:
+    __slots__ = ('verb', 'character', 'argument')
+    RECORD = struct.Struct('<BBB')
+    NIGHT = 0
+    MOVE = 1
+    TURN = 2
+    SEEK = 3
+    FIGHT = 4
+    RECRUIT = 5
+    RECRUIT_MEN = 6
+    GUARD = 7
+    HIDE = 8
+    DROP = 9
+
+    def __init__(self, verb: int, character: int = 0, argument: int = 0) -> None:
+        self.verb = verb
+        self.character = character
+        self.argument = argument
+
+    def get_verb(self) -> int:
+        return self.verb
+
+    def get_character(self) -> int:
+        return self.character
+
+    def get_argument(self) -> int:
+        return self.argument
+
+    def apply(self, game: Midnight) -> None:
+        if self.verb == self.NIGHT:
+            game.night()
+            game.dawn()
+            return
+        character = game.characters[self.character]
+        if self.verb == self.MOVE:
+            character.walk_forward()
+        elif self.verb == self.TURN:
+            character.set_direction(Direction.values[self.argument])
+        elif self.verb == self.SEEK:
+            character.seek()
+        elif self.verb == self.FIGHT:
+            character.fight()
+        elif self.verb == self.RECRUIT:
+            character.recruit(game.characters[self.argument])
+        elif self.verb == self.RECRUIT_MEN:
+            character.recruit_men()
+        elif self.verb == self.GUARD:
+            character.stand_on_guard()
+        elif self.verb == self.HIDE:
+            character.set_hidden(self.argument != 0)
+        elif self.verb == self.DROP:
+            character.drop_object()
+        else:
+            raise ValueError(f"Unknown command {self.verb}")
+
+    def pack(self) -> bytes:
+        return self.RECORD.pack(self.verb, self.character, self.argument)
+
+    @staticmethod
+    def unpack(data: bytes) -> 'Command':
+        return Command(*Command.RECORD.unpack(data))
+
+    @staticmethod
+    def apply_packed(game: Midnight, data: bytes) -> None:
+        Command.unpack(data).apply(game)
+
+    def __eq__(self, other):
+        return isinstance(other, Command) and self.pack() == other.pack()
+
+    def __str__(self):
+        return f"{self.verb} {self.character} {self.argument}"
+
+
+class CommandLog:
+    MAGIC = b'JLOR'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHqI')
+
+    def __init__(self, seed: int) -> None:
+        self.seed = seed
+        self.commands: list[Command] = []
+
+    def get_seed(self) -> int:
+        return self.seed
+
+    def get_commands(self) -> list[Command]:
+        return self.commands
+
+    def create_game(self) -> Midnight:
+        return Midnight(Random(self.seed), self.seed)
+
+    def record(self, command: Command) -> None:
+        self.commands.append(command)
+
+    def save(self, ox: BinaryIO) -> None:
+        ox.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.seed, len(self.commands)))
+        ox.write(b''.join(command.pack() for command in self.commands))
+
+    @staticmethod
+    def load(ix: BinaryIO) -> 'CommandLog':
+        magic, version, seed, count = CommandLog.HEADER.unpack(ix.read(CommandLog.HEADER.size))
+        if magic != CommandLog.MAGIC:
+            raise ValueError("Not a command log")
+        if version != CommandLog.VERSION:
+            raise ValueError(f"Unsupported command log version {version}")
+        log = CommandLog(seed)
+        size = Command.RECORD.size
+        data = ix.read(size * count)
+        log.commands = [Command.unpack(data[i:i + size]) for i in range(0, len(data), size)]
+        return log
+
+
+class Replay:
+    CHECKPOINT_EVERY = 5
+
+    def __init__(self, log: CommandLog, checkpoint_every: int = CHECKPOINT_EVERY) -> None:
+        self.log = log
+        self.checkpoint_every = checkpoint_every
+        # Each checkpoint is (day, commands applied, a fork of the game at that point).
+        self.checkpoints: list[tuple[int, int, Midnight]] = [(0, 0, log.create_game())]
+
+    def get_checkpoints(self) -> list[tuple[int, int, Midnight]]:
+        return self.checkpoints
+
+    def seek(self, day: Optional[int] = None) -> Midnight:
+        if day is None:
+            checkpoint = len(self.checkpoints) - 1
+        else:
+            checkpoint = bisect.bisect_right([checkpoint[0] for checkpoint in self.checkpoints], day) - 1
+        _, position, game = self.checkpoints[checkpoint]
+        return self.play(game.fork(), position, day)
+
+    def fast_forward(self) -> Midnight:
+        return self.seek()
+
+    def play(self, game: Midnight, position: int, day: Optional[int]) -> Midnight:
+        commands = self.log.get_commands()
+        while position < len(commands) and (day is None or game.get_day() < day):
+            commands[position].apply(game)
+            position += 1
+            if game.get_day() > self.checkpoints[-1][0] and game.get_day() % self.checkpoint_every == 0:
+                self.checkpoints.append((game.get_day(), position, game.fork()))
+        return game
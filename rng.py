@@ -0,0 +1,156 @@
+import copy
+import importlib
+import struct
+from abc import ABC
+from random import Random
+from typing import Any, Optional, BinaryIO
+
+
+class RandomSource(ABC):
+    def random(self, n: int) -> int:
+        raise NotImplementedError()
+
+    def get_state(self) -> Any:
+        raise NotImplementedError()
+
+    def set_state(self, state: Any) -> None:
+        raise NotImplementedError()
+
+    def fork(self) -> 'RandomSource':
+        raise NotImplementedError()
+
+    def save(self, ox: BinaryIO) -> None:
+        raise NotImplementedError()
+
+    @staticmethod
+    def load(ix: BinaryIO) -> 'RandomSource':
+        tag = ix.read(1)[0]
+        if tag == ReproducibleRandomSource.TAG:
+            return ReproducibleRandomSource.load(ix)
+        if tag == BatchedRandomSource.TAG:
+            return BatchedRandomSource.load(ix)
+        raise ValueError(f"Unknown random source {tag}")
+
+
+class ReproducibleRandomSource(RandomSource):
+    TAG = 0
+    STATE = struct.Struct('<B625IBd')
+    NAME = struct.Struct('<H')
+
+    def __init__(self, generator: Random) -> None:
+        self.generator = generator
+
+    def random(self, n: int) -> int:
+        return self.generator.randint(0, n)
+
+    def get_generator(self) -> Random:
+        return self.generator
+
+    def get_state(self) -> Any:
+        return self.generator.getstate()
+
+    def set_state(self, state: Any) -> None:
+        self.generator.setstate(state)
+
+    def fork(self) -> 'ReproducibleRandomSource':
+        return ReproducibleRandomSource(copy.copy(self.generator))
+
+    def save(self, ox: BinaryIO) -> None:
+        generator_class = type(self.generator)
+        name = f"{generator_class.__module__}:{generator_class.__qualname__}"
+        if self.find_class(name) is not generator_class:
+            raise ValueError(f"Cannot save {name}")
+        version, internal, gauss = self.generator.getstate()
+        ox.write(bytes([self.TAG]))
+        ox.write(self.NAME.pack(len(name.encode())) + name.encode())
+        ox.write(self.STATE.pack(version, *internal, gauss is not None, gauss or 0.0))
+
+    @staticmethod
+    def load(ix: BinaryIO) -> 'ReproducibleRandomSource':
+        length, = ReproducibleRandomSource.NAME.unpack(ix.read(ReproducibleRandomSource.NAME.size))
+        name = ix.read(length).decode()
+        generator_class = ReproducibleRandomSource.find_class(name)
+        if generator_class is None:
+            raise ValueError(f"Unknown generator {name}")
+        values = ReproducibleRandomSource.STATE.unpack(ix.read(ReproducibleRandomSource.STATE.size))
+        generator = generator_class()
+        generator.setstate((values[0], values[1:626], values[627] if values[626] else None))
+        return ReproducibleRandomSource(generator)
+
+    @staticmethod
+    def find_class(name: str) -> Optional[type]:
+        # As with pickle, a generator is rebuilt by calling its class with no arguments and restoring the state, so
+        # the class has to be reachable from its module by name.
+        module, _, qualname = name.partition(':')
+        try:
+            generator_class = importlib.import_module(module)
+            for part in qualname.split('.'):
+                generator_class = getattr(generator_class, part)
+        except (ImportError, AttributeError):
+            return None
+        if not isinstance(generator_class, type) or not issubclass(generator_class, Random):
+            return None
+        return generator_class
+
+
+class BatchedRandomSource(RandomSource):
+    TAG = 1
+    BLOCK_SIZE = 4096
+    STATE = struct.Struct('<4QBII')
+
+    def __init__(self, seed: Optional[int] = None, block_size: int = BLOCK_SIZE) -> None:
+        import numpy as np
+
+        self.generator = np.random.default_rng(seed)
+        self.block_size = block_size
+        self.block = []
+        self.position = 0
+
+    def fill(self) -> None:
+        self.block = self.generator.integers(0, 1 << 32, size=self.block_size, dtype='uint64').tolist()
+        self.position = 0
+
+    def random(self, n: int) -> int:
+        if self.position == len(self.block):
+            self.fill()
+        bits = self.block[self.position]
+        self.position += 1
+        # Multiply-shift maps 32 random bits onto 0..n inclusive, the same range as Random.randint(0, n).
+        return (bits * (n + 1)) >> 32
+
+    def get_state(self) -> Any:
+        return self.generator.bit_generator.state, list(self.block), self.position
+
+    def set_state(self, state: Any) -> None:
+        self.generator.bit_generator.state, block, self.position = state
+        self.block = list(block)
+
+    def fork(self) -> 'BatchedRandomSource':
+        source = BatchedRandomSource(block_size=self.block_size)
+        source.set_state(self.get_state())
+        return source
+
+    def save(self, ox: BinaryIO) -> None:
+        state = self.generator.bit_generator.state
+        if state['bit_generator'] != 'PCG64':
+            raise ValueError(f"Cannot save {state['bit_generator']} state")
+        mask = (1 << 64) - 1
+        remaining = self.block[self.position:]
+        ox.write(bytes([self.TAG]))
+        ox.write(self.STATE.pack(state['state']['state'] >> 64, state['state']['state'] & mask,
+                                 state['state']['inc'] >> 64, state['state']['inc'] & mask, state['has_uint32'],
+                                 state['uinteger'], self.block_size))
+        ox.write(struct.pack(f'<I{len(remaining)}I', len(remaining), *remaining))
+
+    @staticmethod
+    def load(ix: BinaryIO) -> 'BatchedRandomSource':
+        high, low, inc_high, inc_low, has_uint32, uinteger, block_size = BatchedRandomSource.STATE.unpack(
+            ix.read(BatchedRandomSource.STATE.size))
+        count, = struct.unpack('<I', ix.read(4))
+        source = BatchedRandomSource(block_size=block_size)
+        source.generator.bit_generator.state = {'bit_generator': 'PCG64',
+                                                'state': {'state': high << 64 | low, 'inc': inc_high << 64 | inc_low},
+                                                'has_uint32': has_uint32, 'uinteger': uinteger}
+        source.block = list(struct.unpack(f'<{count}I', ix.read(4 * count)))
+        source.position = 0
+        return source
@@ -0,0 +1,68 @@
+import time
+from random import Random
+
+from enums import Race, Type
+from game import Army, Battle
+from battles import BattleResolver
+from odds import Strikers
+from rng import ReproducibleRandomSource
+
+TRIALS = 10000
+SCENARIOS = [
+    # Small foul armies that the free side wipes out part way through its attacks.
+    (((60, 120), (40, 110)), ((200, 120), (100, 110)), ((10, 20), (15, 10), (5, 0))),
+    # A weak free side that the foul counterattack wipes out.
+    (((10, 60),), ((10, 40), (5, 30)), ((200, 120), (150, 100))),
+    # Evenly matched rosters that mostly end in a draw.
+    (((30, 100),), ((300, 90),), ((300, 80), (100, 60))),
+]
+
+
+def scalar_trial(battle: Battle, characters: Strikers, free: Strikers, foul: Strikers) -> tuple:
+    battle.free = [Army(None, Race.FREE, how_many, Type.WARRIORS) for how_many, _ in free]
+    battle.foul = [Army(None, Race.FOUL, how_many, Type.WARRIORS) for how_many, _ in foul]
+    for army, (_, chance) in zip(battle.free + battle.foul, free + foul):
+        army.set_success_chance(chance)
+    free_armies = list(battle.free)
+    foul_armies = list(battle.foul)
+
+    # The same order of attacks as Battle.run.
+    for strength, energy in characters:
+        battle.skirmish(strength, energy + 0x80, battle.foul)
+    for army in battle.free:
+        battle.skirmish(army.get_how_many() // 5, army.get_success_chance(), battle.foul)
+    for army in battle.foul:
+        battle.skirmish(army.get_how_many() // 5, army.get_success_chance(), battle.free)
+
+    winner = Race.FREE if len(battle.foul) == 0 else Race.FOUL if len(battle.free) == 0 else None
+    return (winner, sum(army.get_casualties() for army in free_armies),
+            sum(army.get_casualties() for army in foul_armies))
+
+
+def test_resolver_matches_scalar_skirmish():
+    for characters, free, foul in SCENARIOS:
+        battle = Battle.__new__(Battle)
+        battle.random_source = ReproducibleRandomSource(Random(1))
+        results = [scalar_trial(battle, characters, free, foul) for _ in range(TRIALS)]
+        statistics = BattleResolver(None, 1).simulate_inputs(characters, free, foul, TRIALS)
+
+        for race in [Race.FREE, Race.FOUL, None]:
+            scalar = sum(1 for winner, _, _ in results if winner == race) / TRIALS
+            assert abs(statistics.get_winners()[race] / TRIALS - scalar) < 0.03, (characters, free, foul, race)
+        for index, histogram in [(1, statistics.get_free_casualties()), (2, statistics.get_foul_casualties())]:
+            scalar = sum(result[index] for result in results) / TRIALS
+            batch = sum(n * count for n, count in enumerate(histogram)) / TRIALS
+            assert abs(batch - scalar) <= 0.05 * scalar + 1, (characters, free, foul, index)
+
+
+def test_resolver_keeps_large_battles_under_a_second():
+    # Four times the first scenario: 28 units a side at the scale the odds screen asks for.
+    characters, free, foul = (rank * 4 for rank in SCENARIOS[0])
+    resolver = BattleResolver(None, 1)
+    timings = []
+    for _ in range(2):
+        start = time.perf_counter()
+        statistics = resolver.simulate_inputs(characters, free, foul, 100000)
+        timings.append(time.perf_counter() - start)
+    assert sum(statistics.get_winners().values()) == 100000
+    assert min(timings) < 1.0, timings
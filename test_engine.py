@@ -0,0 +1,17 @@
+from random import Random
+
+from engine import DoomguardEngine
+from game import Midnight
+from test_save import play, save
+
+
+def test_compatible_mode_matches_scalar_path():
+    for seed in range(1, 6):
+        scalar = Midnight(Random(seed), seed)
+        compatible = Midnight(Random(seed), seed)
+        compatible.set_doomguard_engine(DoomguardEngine(compatible, compatible=True))
+        for _ in range(10):
+            play(scalar, 1)
+            play(compatible, 1)
+            assert save(compatible) == save(scalar)
+            assert compatible.get_random_source().get_state() == scalar.get_random_source().get_state()
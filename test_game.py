@@ -0,0 +1,119 @@
+import heapq
+import io
+from random import Random
+
+from enums import Direction, Race
+from game import Character, Location, Midnight, RouteGraph
+from test_save import play, save
+
+
+def test_citadels_snapshot_at_night():
+    for seed in range(1, 4):
+        game = Midnight(Random(seed), seed)
+        assert game.get_doom_darks_citadels() == 0
+        for night in range(6):
+            if night == 3:
+                # Guards changing sides during the day move the running total but not the night's figure.
+                guard = next(army for army in game.armies if army.get_race() == Race.FREE)
+                before = game.get_doom_darks_citadels()
+                guard.switch_sides()
+                assert game.get_doom_darks_citadels() == before
+            count = game.count_doom_darks_citadels()
+            assert game.citadel_count == count
+            play(game, 1)
+            assert game.get_doom_darks_citadels() == count
+            assert game.citadel_count == game.count_doom_darks_citadels()
+
+
+def walk_everywhere(character: Character) -> dict[Location, int]:
+    # The cells the character can walk to with the most time left on arrival, found by walking the best route to
+    # each cell with walk_forward and undoing it again.
+    game = character.get_game()
+    start = character.get_location()
+    times = {start: character.get_time().get_time()}
+    routes = {start: []}
+    queue = [(-times[start], 0, start)]
+    pushed = 0
+    while queue:
+        time, _, location = heapq.heappop(queue)
+        if -time < times[location]:
+            continue
+        for last in Direction.values:
+            route = routes[location] + [last]
+            depth = len(game.undo_stack)
+            walked = 0
+            for step in route:
+                character.set_direction(step)
+                if not character.can_walk_forward():
+                    break
+                character.walk_forward()
+                walked += 1
+            destination = character.get_location()
+            if walked == len(route) and (destination not in times or character.get_time().get_time() > times[
+                    destination]):
+                times[destination] = character.get_time().get_time()
+                routes[destination] = route
+                pushed += 1
+                heapq.heappush(queue, (-times[destination], pushed, destination))
+            while len(game.undo_stack) > depth:
+                game.undo()
+    return times
+
+
+def test_reachable_matches_walking():
+    game = Midnight(Random(3), 3)
+    play(game, 2)
+    game.MORKIN.set_on_horse(False)
+    # Low enough that the lord turns utterly tired part way through the day.
+    game.CORLETH.set_energy(24)
+    # The dragon's steps all cost one, so a short day keeps the walk small.
+    game.FARFLAME.get_time().decrease(10)
+    for character in [game.LUXOR, game.MORKIN, game.CORLETH, game.FARFLAME]:
+        assert game.get_map().calc_reachable(character) == walk_everywhere(character), character.get_name()
+
+
+def test_touched_cells_find_every_battle():
+    fought = 0
+    for seed in range(1, 4):
+        game = Midnight(Random(seed), seed)
+        # In debug mode every night checks the touched cells against a scan of every unit.
+        game.set_debug(True)
+        for _ in range(10):
+            game.night()
+            fought += len(game.battles)
+            game.dawn()
+    assert fought > 0
+
+
+def get_shared(fork: object, original: object) -> list[str]:
+    # Attributes the fork still shares with the original, other than immutable values.
+    return [name for name, value in vars(original).items() if vars(fork)[name] is value and not isinstance(
+        value, (int, str, tuple, frozenset, RouteGraph, type(None)))]
+
+
+def test_fork_leaves_original_untouched():
+    for seed in range(1, 4):
+        game = Midnight(Random(seed), seed)
+        play(game, 3)
+        game.LUXOR.walk_forward()
+        before = save(game), game.get_random_source().get_state()
+        fork = game.fork()
+        assert get_shared(fork, game) == [] and get_shared(fork.get_map(), game.get_map()) == []
+        assert fork.undo_stack == [] and fork.redo_stack == []
+
+        for character in [fork.LUXOR, fork.MORKIN, fork.CORLETH, fork.ROTHRON]:
+            character.set_direction(Direction.SOUTH)
+            while character.can_walk_forward():
+                character.walk_forward()
+            if character.can_fight():
+                character.fight()
+            character.seek()
+        fork.undo()
+        play(fork, 4)
+        assert (save(game), game.get_random_source().get_state()) == before
+
+        # The original plays on as if the fork had never been made.
+        loaded = Midnight.load(io.BytesIO(before[0]))
+        play(game, 2)
+        play(loaded, 2)
+        assert save(game) == save(loaded)
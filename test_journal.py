@@ -0,0 +1,49 @@
+import os
+from random import Random
+
+from game import Midnight
+from journal import Journal
+from test_save import play, save
+
+
+def test_recover_replays_journal(tmp_path):
+    game = Midnight(Random(3), 3)
+    journal = Journal(str(tmp_path), flush_delay=0, compact_every=3)
+    for _ in range(5):
+        play(game, 1)
+        journal.record_state(game)
+    journal.close()
+    assert save(Journal.recover(str(tmp_path))) == save(game)
+
+
+def test_recover_skips_records_covered_by_snapshot(tmp_path):
+    game = Midnight(Random(4), 4)
+    journal = Journal(str(tmp_path), flush_delay=0)
+    play(game, 1)
+    journal.record_state(game)
+    journal.flush()
+
+    # Stop after the snapshot replaces the old one but before the journal is truncated.
+    play(game, 2)
+    journal.journal.close()
+    journal.journal = open(os.devnull, 'wb')
+    with open(journal.get_path(Journal.SNAPSHOT), 'wb') as ox:
+        ox.write(Journal.GENERATION.pack(journal.generation + 1))
+        ox.write(save(game))
+    journal.close()
+
+    assert len(Journal.read_records(journal.get_path(Journal.JOURNAL))) == 1
+    assert save(Journal.recover(str(tmp_path))) == save(game)
+
+
+def test_new_session_drops_torn_tail(tmp_path):
+    journal = Journal(str(tmp_path), flush_delay=0)
+    journal.record_command(b'a')
+    journal.close()
+    with open(journal.get_path(Journal.JOURNAL), 'ab') as ox:
+        ox.write(b'\x05\x00')
+
+    journal = Journal(str(tmp_path), flush_delay=0)
+    journal.record_command(b'b')
+    journal.close()
+    assert Journal.read_records(journal.get_path(Journal.JOURNAL)) == [(Journal.COMMAND, b'a'), (Journal.COMMAND, b'b')]
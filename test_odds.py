@@ -0,0 +1,46 @@
+from random import Random
+
+from enums import Race
+from game import Midnight, Battle
+from odds import estimate, estimate_battle
+from rng import ReproducibleRandomSource
+from test_battles import SCENARIOS, TRIALS, scalar_trial
+
+BATTLES = 1000
+
+
+def test_estimate_matches_scalar_skirmish():
+    for characters, free, foul in SCENARIOS:
+        battle = Battle.__new__(Battle)
+        battle.random_source = ReproducibleRandomSource(Random(2))
+        results = [scalar_trial(battle, characters, free, foul) for _ in range(TRIALS)]
+        odds = estimate(characters, free, foul)
+
+        for race, chance in [(Race.FREE, odds.get_win()), (None, odds.get_draw()), (Race.FOUL, odds.get_loss())]:
+            assert abs(sum(1 for winner, _, _ in results if winner == race) / TRIALS - chance) < 0.03
+        for index, casualties in [(1, odds.get_free_casualties()), (2, odds.get_foul_casualties())]:
+            scalar = sum(result[index] for result in results) / TRIALS
+            assert abs(casualties - scalar) <= 0.05 * scalar + 0.5
+
+
+def test_estimate_matches_battle_run():
+    game = Midnight(Random(1), 1)
+    location = game.get_map().get_location(30, 30)
+    for character in game.characters[4:6]:
+        character.set_location(location)
+    for army, how_many in zip(game.doomguard[0:3], [10, 15, 5]):
+        army.set_location(location)
+        army.set_how_many(how_many)
+    odds = estimate_battle(location)
+
+    winners = {Race.FREE: 0, Race.FOUL: 0, None: 0}
+    source = ReproducibleRandomSource(Random(3))
+    for _ in range(BATTLES):
+        trial = game.fork()
+        battle = Battle(trial.get_map().get_location(30, 30), Race.FREE)
+        battle.random_source = source
+        battle.run()
+        winners[battle.get_winner()] += 1
+    assert abs(winners[Race.FREE] / BATTLES - odds.get_win()) < 0.05
+    assert abs(winners[None] / BATTLES - odds.get_draw()) < 0.05
+    assert abs(winners[Race.FOUL] / BATTLES - odds.get_loss()) < 0.05
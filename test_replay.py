@@ -0,0 +1,68 @@
+import io
+from random import Random
+
+from game import Midnight
+from replay import Command, CommandLog, Replay
+from test_save import save
+
+DAYS = 12
+
+
+def record(seed: int) -> tuple[CommandLog, dict[int, bytes]]:
+    log = CommandLog(seed)
+    game = log.create_game()
+    picks = Random(seed)
+    saves = {0: save(game)}
+
+    def run(command: Command) -> None:
+        command.apply(game)
+        log.record(command)
+
+    for _ in range(DAYS):
+        for character in [game.LUXOR, game.MORKIN, game.CORLETH, game.ROTHRON]:
+            run(Command(Command.TURN, character.get_id(), picks.randrange(8)))
+            for _ in range(picks.randrange(4)):
+                if character.can_walk_forward():
+                    run(Command(Command.MOVE, character.get_id()))
+            if character.can_fight() and character not in [game.LUXOR, game.MORKIN]:
+                run(Command(Command.FIGHT, character.get_id()))
+            run(Command(Command.SEEK, character.get_id()))
+            for other in character.get_location().get_characters():
+                if character.can_recruit(other):
+                    run(Command(Command.RECRUIT, character.get_id(), other.get_id()))
+        run(Command(Command.NIGHT))
+        saves[game.get_day()] = save(game)
+    return log, saves
+
+
+def play_to(log: CommandLog, day: int) -> Midnight:
+    game = log.create_game()
+    for command in log.get_commands():
+        if game.get_day() >= day:
+            break
+        command.apply(game)
+    return game
+
+
+def test_fast_forward_matches_recording():
+    for seed in range(1, 4):
+        log, saves = record(seed)
+        ox = io.BytesIO()
+        log.save(ox)
+        loaded = CommandLog.load(io.BytesIO(ox.getvalue()))
+        assert [command.pack() for command in loaded.get_commands()] == [command.pack() for command in log.get_commands()]
+
+        game = Replay(loaded, checkpoint_every=3).fast_forward()
+        assert game.get_day() == DAYS
+        assert save(game) == saves[DAYS]
+
+
+def test_seek_matches_straight_play():
+    log, saves = record(5)
+    replay = Replay(log, checkpoint_every=3)
+    replay.fast_forward()
+    assert [checkpoint[0] for checkpoint in replay.get_checkpoints()] == list(range(0, DAYS + 1, 3))
+    for day in [0, 1, 3, 4, 8, DAYS, 2, 11]:
+        game = replay.seek(day)
+        assert game.get_day() == day
+        assert save(game) == save(play_to(log, day)) == saves[day]
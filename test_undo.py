@@ -0,0 +1,31 @@
+from random import Random
+
+from enums import Object
+from game import Character, Midnight
+from test_save import save
+
+
+def test_undo_redo_fights():
+    game = Midnight(Random(5), 5)
+    for character in game.characters:
+        character.get_riders().set_how_many(0)
+        character.get_warriors().set_how_many(0)
+        character.get_location().set_object(Object.WOLVES)
+    before = save(game), game.get_random_source().get_state()
+
+    fights = 0
+    for character in game.characters:
+        if character.is_alive():
+            character.fight()
+            fights += 1
+    after = save(game), game.get_random_source().get_state()
+    # A day of fights by every character stays within the budget.
+    assert len(game.undo_stack) == fights
+
+    while game.undo():
+        pass
+    assert (save(game), game.get_random_source().get_state()) == before
+    while game.redo():
+        pass
+    assert (save(game), game.get_random_source().get_state()) == after
+    assert Character.fight.__name__ == 'fight'